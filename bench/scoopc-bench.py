@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+#-------------------------------------------------------------------------------
+# Copyright (c) 2010 Patrick Mueller
+# Licensed under the MIT license: 
+# http://www.opensource.org/licenses/mit-license.php
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import resource
+import optparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import scoopc
+
+PROGRAM = os.path.basename(sys.argv[0])
+
+#-------------------------------------------------------------------------------
+def main():
+    (options, args) = parseArgs()
+    
+    random.seed(options.seed)
+    
+    tmpDir    = tempfile.mkdtemp(prefix="scoopc-bench-")
+    corpusDir = options.corpusDir or os.path.join(tmpDir, "corpus")
+    outDir    = os.path.join(tmpDir, "out")
+    
+    try:
+        if not options.corpusDir:
+            generateCorpus(corpusDir, options)
+            
+        results = runBenchmarks(corpusDir, outDir, options)
+    finally:
+        shutil.rmtree(tmpDir)
+        
+    report(results)
+    
+    if options.resultsFileName:
+        with open(options.resultsFileName, "w") as rFile:
+            json.dump(results, rFile, indent=1, sort_keys=True)
+            
+    if options.baselineFileName:
+        with open(options.baselineFileName) as bFile:
+            baseline = json.load(bFile)
+            
+        regressions = compareResults(baseline, results, options.threshold)
+        
+        for regression in regressions:
+            print "%s: regression: %s" % (PROGRAM, regression)
+            
+        if regressions: sys.exit(1)
+
+#-------------------------------------------------------------------------------
+def generateCorpus(corpusDir, options):
+    for fileIndex in range(options.files):
+        fileName = os.path.join(corpusDir, "dir%d" % (fileIndex % 10), "Module%d.scoop" % fileIndex)
+        
+        if not os.path.exists(os.path.dirname(fileName)):
+            os.makedirs(os.path.dirname(fileName))
+            
+        with open(fileName, "w") as file:
+            file.write(generateModule(fileIndex, options))
+
+#-------------------------------------------------------------------------------
+def generateModule(fileIndex, options):
+    lines = []
+    
+    for classIndex in range(options.classes):
+        className = "Class%d_%d" % (fileIndex, classIndex)
+        
+        lines.append("//-----------------------------------------------------------------------------")
+        if classIndex == 0:
+            lines.append("class %s(a, b)" % className)
+        else:
+            lines.append("class %s(a, b) < Class%d_%d" % (className, fileIndex, classIndex - 1))
+            lines.append("    super(a, b)")
+            
+        lines.append("    this.a = a")
+        lines.append("    this.b = b")
+        lines.append("")
+        
+        for methodIndex in range(options.methods):
+            lines.append("//-----------------------------------------------------------------------------")
+            lines.append("method method%d(x, y)" % methodIndex)
+            
+            for lineIndex in range(options.bodyLines):
+                lines.append('    var v%d = x + y * %d // "comment" with super( in it' % (lineIndex, lineIndex))
+                
+            if classIndex and random.random() < options.superDensity:
+                lines.append("    return super(x, y) + super.method0(y, x)")
+            else:
+                lines.append("    return x")
+                
+            lines.append("")
+            
+    lines.append("//-----------------------------------------------------------------------------")
+    lines.append("init")
+    lines.append("    var instance = new Class%d_0(1, 2)" % fileIndex)
+    lines.append("")
+    
+    return "\n".join(lines)
+
+#-------------------------------------------------------------------------------
+def runBenchmarks(corpusDir, outDir, options):
+    scoopc.Options = scoopc.parseArgs(["--force", "--quiet", "--jobs", str(options.jobs), "--out", outDir, corpusDir])[0]
+    
+    jobs = scoopc.collectFiles([corpusDir])
+    
+    sources = []
+    for (iFileName, path) in jobs:
+        with open(iFileName) as iFile:
+            sources.append((iFileName, path, iFile.read()))
+            
+    lineCount = sum(source.count("\n") + 1 for (_, _, source) in sources)
+    
+    results = {
+        "version": scoopc.VERSION,
+        "corpus":  {
+            "files": len(sources),
+            "lines": lineCount,
+            "bytes": sum(len(source) for (_, _, source) in sources)
+        }
+    }
+    
+    # compile() alone, in this process, over sources already in memory
+    compileOptions = scoopc.CompileOptions.fromOptions(scoopc.Options)
+    
+    def compileAll():
+        for (iFileName, path, source) in sources:
+            baseName = os.path.basename(iFileName)[:-6]
+            scoopc.compile(source, iFileName, path, baseName, compileOptions)
+            
+    results["compile"] = timeRuns(compileAll, len(sources), lineCount, options.repeat)
+    
+    # the full build, reading and writing files with the worker pool
+    def buildAll():
+        (failures, entries) = scoopc.runJobs(jobs)
+        if failures: raise Exception("compile failures: %s" % failures[0][0])
+        
+    results["build"] = timeRuns(buildAll, len(sources), lineCount, options.repeat)
+    
+    scoopc.closePool()
+    
+    results["peakRSSKB"] = {
+        "self":     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    }
+    
+    return results
+
+#-------------------------------------------------------------------------------
+def timeRuns(function, fileCount, lineCount, repeat):
+    
+    # the best of the runs is the least disturbed by everything else
+    best = None
+    for run in range(repeat):
+        start   = time.time()
+        function()
+        elapsed = time.time() - start
+        
+        if None == best or elapsed < best: best = elapsed
+        
+    best = max(best, 1e-9)
+    
+    return {
+        "seconds":        best,
+        "filesPerSecond": fileCount / best,
+        "linesPerSecond": lineCount / best
+    }
+
+#-------------------------------------------------------------------------------
+def compareResults(baseline, results, threshold):
+    regressions = []
+    
+    for phase in ["compile", "build"]:
+        if phase not in baseline: continue
+        
+        for metric in ["filesPerSecond", "linesPerSecond"]:
+            old = baseline[phase][metric]
+            new = results[phase][metric]
+            
+            if new < old * (1 - threshold / 100.0):
+                regressions.append("%s %s dropped from %.1f to %.1f" % (phase, metric, old, new))
+                
+    if "peakRSSKB" in baseline:
+        old = baseline["peakRSSKB"]["self"]
+        new = results["peakRSSKB"]["self"]
+        
+        if new > old * (1 + threshold / 100.0):
+            regressions.append("peak RSS grew from %d KB to %d KB" % (old, new))
+            
+    return regressions
+
+#-------------------------------------------------------------------------------
+def report(results):
+    corpus = results["corpus"]
+    
+    print "%s: corpus: %d files, %d lines, %d bytes" % (PROGRAM, corpus["files"], corpus["lines"], corpus["bytes"])
+    
+    for phase in ["compile", "build"]:
+        phaseResults = results[phase]
+        print "%s: %-8s %8.3f sec %10.1f files/sec %12.1f lines/sec" % (
+            PROGRAM, phase, phaseResults["seconds"], phaseResults["filesPerSecond"], phaseResults["linesPerSecond"]
+        )
+        
+    rss = results["peakRSSKB"]
+    print "%s: peak RSS: %d KB (workers: %d KB)" % (PROGRAM, rss["self"], rss["children"])
+
+#-------------------------------------------------------------------------------
+def parseArgs():
+    usage        = "usage: %s [options]" % PROGRAM
+    description  = "Generates a synthetic .scoop corpus and measures scoopc.py compiling it."
+        
+    parser = optparse.OptionParser(usage=usage, description=description)
+    
+    parser.add_option("--files", dest="files", metavar="N", type="int", default=200,
+        help="generate N .scoop files (default: %default)"
+    )
+    
+    parser.add_option("--classes", dest="classes", metavar="N", type="int", default=5,
+        help="generate N classes per file (default: %default)"
+    )
+    
+    parser.add_option("--methods", dest="methods", metavar="N", type="int", default=10,
+        help="generate N methods per class (default: %default)"
+    )
+    
+    parser.add_option("--body-lines", dest="bodyLines", metavar="N", type="int", default=8,
+        help="generate N lines per method body (default: %default)"
+    )
+    
+    parser.add_option("--super-density", dest="superDensity", metavar="F", type="float", default=0.5,
+        help="fraction of subclass methods which invoke super (default: %default)"
+    )
+    
+    parser.add_option("--corpus", dest="corpusDir", metavar="DIR", default=None,
+        help="benchmark the .scoop files in DIR instead of generating them"
+    )
+    
+    parser.add_option("--seed", dest="seed", metavar="N", type="int", default=0,
+        help="random seed for generating the corpus (default: %default)"
+    )
+    
+    parser.add_option("-j", "--jobs", dest="jobs", metavar="N", type="int", default=scoopc.defaultJobs(),
+        help="build with N worker processes (default: %default)"
+    )
+    
+    parser.add_option("--repeat", dest="repeat", metavar="N", type="int", default=3,
+        help="time the best of N runs (default: %default)"
+    )
+    
+    parser.add_option("--results", dest="resultsFileName", metavar="FILE", default=None,
+        help="write the results as JSON to FILE"
+    )
+    
+    parser.add_option("--baseline", dest="baselineFileName", metavar="FILE", default=None,
+        help="fail if the results regressed from the JSON results in FILE"
+    )
+    
+    parser.add_option("--threshold", dest="threshold", metavar="PERCENT", type="float", default=10,
+        help="regression allowed before failing (default: %default%)"
+    )
+    
+    return parser.parse_args()
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
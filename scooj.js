@@ -88,6 +88,155 @@ addExport(function defClass(module, superclass, func) {
     return func
 })
 
+//----------------------------------------------------------------------------
+addExport(function defLazyClass(module, stub, load, staticNames) {
+    if (null == module) {
+        throw new Error("must pass a module as the first parameter")
+    }
+    
+    if (null == module.id) {
+        throw new Error("module parameter has no id")
+    }
+    
+    ensureNamedFunction(stub)
+    
+    stub._scoojLazy = {}
+    stub._scoojLazy.load       = load
+    stub._scoojLazy.extensions = []
+    stub._scoojLazy.moduleId   = module.id
+    stub._scoojLazy.klass      = null
+    stub._scoojLazy.prototype  = stub.prototype
+    stub._scoojLazy.names      = []
+    
+    // until the class is defined, the stub's prototype stands in for the
+    // class's prototype, where proxies are available
+    if (typeof Proxy == "function") {
+        stub.prototype = stub._scoojLazy.prototype = new Proxy({}, getLazyPrototypeHandler(stub))
+    }
+    
+    // getting or setting a static member defines the class
+    var names = ["_scooj", "$super", "signature"].concat(staticNames || [])
+    for (var i=0; i<names.length; i++) {
+        defLazyProperty(stub, names[i])
+    }
+    
+    // export the first class defined in a module
+    // as result of the exported getClass() function
+    if (typeof(module.exports.getClass) != "function") {
+        module.exports.getClass = function getClass() {
+            return stub._scoojLazy.klass || stub
+        }
+    }
+    
+    return stub
+})
+
+//----------------------------------------------------------------------------
+addExport(function loadClass(klass) {
+    if (!klass || !Object.prototype.hasOwnProperty.call(klass, "_scoojLazy")) return klass
+    
+    var lazy = klass._scoojLazy
+    if (lazy.klass) return lazy.klass
+    
+    if (lazy.loading) {
+        throw new Error("class used while it is being defined: " + lazy.moduleId + "::" + klass.name)
+    }
+    
+    var currentClass = scooj._currentClass[lazy.moduleId]
+    
+    lazy.loading = true
+    try {
+        var loaded = lazy.load()
+        
+        for (var i=0; i<lazy.extensions.length; i++) {
+            scooj._currentClass[lazy.moduleId] = loaded
+            lazy.extensions[i]()
+        }
+        
+        lazy.klass = loaded
+    }
+    finally {
+        lazy.loading = false
+        scooj._currentClass[lazy.moduleId] = currentClass
+    }
+    
+    lazy.klass._scooj.lazyStub = klass
+    klass.prototype = lazy.klass.prototype
+    
+    // static properties set on the stub before the class was defined
+    // move to the class
+    var keys = Object.getOwnPropertyNames(klass)
+    for (var i=0; i<keys.length; i++) {
+        var key = keys[i]
+        
+        if (StubProperties.hasOwnProperty(key)) continue
+        if (lazy.names.indexOf(key) != -1) continue
+        
+        var descriptor = Object.getOwnPropertyDescriptor(klass, key)
+        if (!descriptor.configurable) continue
+        
+        Object.defineProperty(lazy.klass, key, descriptor)
+        defLazyProperty(klass, key)
+    }
+    
+    return lazy.klass
+})
+
+//----------------------------------------------------------------------------
+addExport(function extendLazyClass(module, klass, load, staticNames) {
+    var names = staticNames || []
+    
+    // more members of a class which hasn't been defined yet
+    if (Object.prototype.hasOwnProperty.call(klass, "_scoojLazy")) {
+        klass._scoojLazy.extensions.push(load)
+        
+        for (var i=0; i<names.length; i++) {
+            defLazyProperty(klass, names[i])
+        }
+        
+        return
+    }
+    
+    // otherwise the class has been defined, so define them now
+    var currentClass = scooj._currentClass[module.id]
+    
+    scooj._currentClass[module.id] = klass
+    try {
+        load()
+    }
+    finally {
+        scooj._currentClass[module.id] = currentClass
+    }
+    
+    var stub = klass._scooj.lazyStub
+    if (!stub) return
+    
+    for (var i=0; i<names.length; i++) {
+        defLazyProperty(stub, names[i])
+    }
+})
+
+//----------------------------------------------------------------------------
+addExport(function constructLazy(stub, thisp, args) {
+    var lazy  = stub._scoojLazy
+    var klass = exports.loadClass(stub)
+    
+    // called with new before the class was defined, so thisp has the 
+    // stub's original prototype; construct an instance of the class instead
+    if (Object.prototype.isPrototypeOf.call(lazy.prototype, thisp)) {
+        var object = Object.create(klass.prototype)
+        var result = klass.apply(object, args)
+        
+        if ((typeof result == "object") && (null != result)) return result
+        if (typeof result == "function") return result
+        
+        return object
+    }
+    
+    // called with new after the class was defined, or as a superclass
+    return klass.apply(thisp, args)
+})
+
 //----------------------------------------------------------------------------
 addExport(function useMixin(module, mixinObject) {
     var klass = ensureClassCurrentlyDefined(module)
@@ -247,6 +396,56 @@ function addMethod(module, func, isStatic, isGetter, isSetter) {
     return func
 }
 
+//----------------------------------------------------------------------------
+// own properties of a lazy class's stub which belong to the stub itself
+var StubProperties = {
+    _scoojLazy: true,
+    length:     true,
+    name:       true,
+    prototype:  true,
+    arguments:  true,
+    caller:     true
+}
+
+//----------------------------------------------------------------------------
+function defLazyProperty(stub, name) {
+    var names = stub._scoojLazy.names
+    if (names.indexOf(name) == -1) names.push(name)
+    
+    Object.defineProperty(stub, name, {
+        get:          function() { return exports.loadClass(stub)[name] },
+        set:          function(value) { exports.loadClass(stub)[name] = value },
+        enumerable:   true,
+        configurable: true
+    })
+}
+
+//----------------------------------------------------------------------------
+function getLazyPrototypeHandler(stub) {
+    function target() {
+        return exports.loadClass(stub).prototype
+    }
+    
+    return {
+        get:            function(t, key, receiver)        { return Reflect.get(target(), key, receiver) },
+        set:            function(t, key, value, receiver) { return Reflect.set(target(), key, value, receiver) },
+        has:            function(t, key)                  { return Reflect.has(target(), key) },
+        ownKeys:        function(t)                       { return Reflect.ownKeys(target()) },
+        defineProperty: function(t, key, descriptor)      { return Reflect.defineProperty(target(), key, descriptor) },
+        deleteProperty: function(t, key)                  { return Reflect.deleteProperty(target(), key) },
+        getPrototypeOf: function(t)                       { return Reflect.getPrototypeOf(target()) },
+        
+        // the proxy's own target has no properties, so they can't be 
+        // reported as non-configurable
+        getOwnPropertyDescriptor: function(t, key) {
+            var descriptor = Reflect.getOwnPropertyDescriptor(target(), key)
+            if (descriptor) descriptor.configurable = true
+            
+            return descriptor
+        }
+    }
+}
+
 //----------------------------------------------------------------------------
 function ensureNamedFunction(func) {
     if (typeof func != "function") throw new Error("expecting a function: " + func)
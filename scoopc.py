@@ -9,15 +9,59 @@
 import os
 import re
 import sys
+import json
+import time
+import shutil
+import select
+import signal
+import gzip
+import fnmatch
+import hashlib
+import tempfile
+import posixpath
 import optparse
+import multiprocessing
+
+# os.scandir() is in Python 3.5, and the scandir package for older versions
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 PROGRAM = os.path.basename(sys.argv[0])
 VERSION = "1.1.0"
 
 ExtensionScoop      = ".scoop"
 ExtensionJavaScript = ".js"
+ExtensionGzip       = ".gz"
+
+ManifestName = ".scoopc-manifest.json"
+ListingsName = ".scoopc-listings.json"
+IgnoreName   = ".scoopignore"
+
+WatchPollSeconds     = 0.5
+WatchDebounceSeconds = 0.05
+
+CacheTempSeconds = 3600
 
-Options = None
+EmitModes = ["default", "static", "lazy"]
+
+# each module of a bundle or transport target is wrapped in a CommonJS 
+# transport definition
+TransportStart = ';require.define({%s: function(require, exports, module) {'
+TransportEnd   = '\n}});'
+
+Options       = None
+MessageBuffer = None
+FileStats     = None
+FileErrors    = None
+Pool          = None
+Listings      = None
+Parses        = None
+FileParse     = None
 
 #-------------------------------------------------------------------------------
 def main(): 
@@ -27,158 +71,2577 @@ def main():
 
     Options = options    
     
+    # in server mode, files come from requests instead of the command line
+    if Options.server:
+        serve(sys.stdin, sys.stdout)
+        return
+        
+    if Options.socketName:
+        serveSocket(Options.socketName)
+        return
+        
     # make sure files exist
     for iFileName in iFileNames:
         if not os.path.exists(iFileName):
             error("file does not exist: '%s'" % iFileName)
          
-    # for each file/path, process it
-    for iFileName in iFileNames:
-        if os.path.isdir(iFileName):
-            processDir(iFileName)
+    # find all the files to process
+    if Options.cacheListings:
+        readListings()
+        
+    allJobs = collectFiles(iFileNames)
+    
+    if Options.cacheListings:
+        writeListings()
+    
+    stats = None
+    if Options.stats or Options.statsFileName:
+        stats = Stats()
+
+    if Options.bundleFileName:
+        if Options.entries:
+            allJobs = reachableJobs(allJobs, Options.entries)
+            
+        bundle(allJobs, stats)
+        return
+        
+    # find the ones which changed since the last build, and their dependents
+    manifest = {}
+    if not Options.force:
+        manifest = readManifest()
+        
+    jobs = planJobs(allJobs, manifest)
+    
+    # process them, reporting all the failures at the end
+    (failures, entries) = runJobs(jobs, stats, manifest)
+    
+    manifest.update(entries)
+    writeManifest(manifest)
+    
+    if Options.cacheDir:
+        trimCache(Options.cacheDir, Options.cacheSize * 1024 * 1024)
+    
+    if Options.depsFileName:
+        writeDependencies(Options.depsFileName, allJobs, manifest)
+    
+    if stats: reportStats(stats)
+    
+    reportFailures(failures)
+    
+    # watch mode compiles in this process, so the workers aren't needed
+    closePool()
+            
+    # in watch mode, keep going after failures
+    if Options.watch:
+        watch(iFileNames, manifest, failures)
+    
+    if failures and not Options.watch:
+        error("%d of %d files failed to compile" % (len(failures), len(jobs)))
+
+#-------------------------------------------------------------------------------
+def bundle(jobs, stats=None):
+    modules  = []
+    failures = []
+    
+    for index, (messages, failure, contents, fileStats) in enumerate(mapJobs(bundleJob, jobs)):
+        for message in messages:
+            emit(message)
+            
+        if failure: failures.append(failure)
+        else:       modules.append((moduleId(*jobs[index]), contents))
+        
+        if stats: stats.addFile(jobs[index][0], fileStats)
+        
+    closePool()
+    
+    if stats: 
+        start = time.time()
+    
+    reportFailures(failures)
+        
+    if failures:
+        error("%d of %d files failed to compile" % (len(failures), len(jobs)))
+        
+    writeBundle(Options.bundleFileName, modules)
+    
+    log("generated bundle of %d modules in %s" % (len(modules), Options.bundleFileName))
+    
+    if stats:
+        stats.addTime("write", time.time() - start)
+        reportStats(stats)
+    
+#-------------------------------------------------------------------------------
+def reachableJobs(jobs, entries):
+    jobsById = dict((moduleId(iFileName, path), (iFileName, path)) for (iFileName, path) in jobs)
+    
+    for entry in entries:
+        if entry not in jobsById:
+            error("entry module not found: '%s'" % entry)
+            
+    # follow the requires from the entry modules, a level at a time; 
+    # modules outside the bundle, like scooj, are left out of the graph
+    graph    = {}
+    frontier = sorted(set(entries))
+    while frontier:
+        for index, (_, _, dependencies, _) in enumerate(mapJobs(dependenciesJob, [jobsById[id] for id in frontier])):
+            graph[frontier[index]] = [id for id in (dependencies or []) if id in jobsById]
+            
+        frontier = sorted(set(id for ids in graph.values() for id in ids if id not in graph))
+        
+    verbose("bundling %d of %d modules" % (len(graph), len(jobs)))
+    
+    return [jobsById[id] for id in topologicalSort(graph)]
+
+#-------------------------------------------------------------------------------
+def writeBundle(bFileName, modules):
+    
+    parts = []
+    for (moduleId, contents) in modules:
+        parts.append("%s\n" % (TransportStart % json.dumps(moduleId)))
+        parts.append(contents)
+        parts.append("%s\n" % TransportEnd)
+    
+    bDir = os.path.dirname(bFileName)
+    if bDir and not os.path.exists(bDir):
+        os.makedirs(bDir)
+        
+    contents = "".join(parts)
+    with open(bFileName, "w") as bFile:
+        bFile.write(contents)
+        
+    if Options.gzip: writeGzip(bFileName, contents)
+
+#-------------------------------------------------------------------------------
+def planJobs(jobs, manifest):
+    checks = [(iFileName, path, manifest.get(moduleId(iFileName, path))) for (iFileName, path) in jobs]
+    
+    # a module is stale if it or its output changed, or if a module
+    # it depends on, directly or indirectly, is stale
+    stale = set()
+    for index, upToDate in enumerate(mapJobs(checkJob, checks)):
+        if not upToDate: stale.add(moduleId(*jobs[index]))
+        
+    stale = addDependents(stale, manifest)
+    
+    staleJobs = []
+    for (iFileName, path) in jobs:
+        if moduleId(iFileName, path) in stale:
+            staleJobs.append((iFileName, path))
         else:
-            processFile(iFileName)
+            verbose("module %s is up to date in %s" % (moduleId(iFileName, path), outputFileName(iFileName, path, getTargets()[0].dirName)))
+            
+    return staleJobs
+
+#-------------------------------------------------------------------------------
+def addDependents(moduleIds, manifest):
+    dependents = {}
+    for (dependent, entry) in manifest.items():
+        for dependency in entry.get("deps", []):
+            dependents.setdefault(dependency, []).append(dependent)
+            
+    result = set(moduleIds)
+    queue  = list(moduleIds)
+    while queue:
+        for dependent in dependents.get(queue.pop(), []):
+            if dependent in result: continue
+            
+            result.add(dependent)
+            queue.append(dependent)
+            
+    return result
+
+#-------------------------------------------------------------------------------
+def runJobs(jobs, stats=None, manifest=None):
+    
+    # each job gets the module's entry from the last build
+    checks = [(iFileName, path, (manifest or {}).get(moduleId(iFileName, path))) for (iFileName, path) in jobs]
+    
+    # results arrive in job order, so output is the same for any --jobs
+    failures = []
+    entries  = {}
+    for index, (messages, failure, entry, fileStats) in enumerate(mapJobs(processJob, checks)):
+        (iFileName, path) = jobs[index]
+        
+        for message in messages:
+            emit(message)
+            
+        if failure: failures.append(failure)
+        if entry:   entries[moduleId(iFileName, path)] = entry
+        if stats:   stats.addFile(iFileName, fileStats)
+    
+    return (failures, entries)
+
+#-------------------------------------------------------------------------------
+def reportFailures(failures):
+    for failure in failures:
+        for compileError in failure:
+            logError(compileError)
+            
+    if Options.errorsFileName:
+        writeErrors(Options.errorsFileName, failures)
+        
+#-------------------------------------------------------------------------------
+def writeErrors(eFileName, failures):
+    errors = []
+    for failure in failures:
+        for compileError in failure:
+            errors.append(compileError.toJSON())
+            
+    if eFileName == "-":
+        emit(json.dumps(errors, indent=1, sort_keys=True))
+        return
+        
+    with open(eFileName, "w") as eFile:
+        json.dump(errors, eFile, indent=1, sort_keys=True)
+
+#-------------------------------------------------------------------------------
+def mapJobs(function, jobs):
+    global Pool
+    
+    if Options.jobs <= 1 or len(jobs) <= 1:
+        return (function(job) for job in jobs)
+        
+    # the pool is created once, and used for each set of jobs
+    if None == Pool:
+        Pool = multiprocessing.Pool(Options.jobs, initWorker, (Options,))
+        
+    chunkSize = max(1, len(jobs) // (Options.jobs * 4))
+    
+    return Pool.imap(function, jobs, chunkSize)
+
+#-------------------------------------------------------------------------------
+def closePool():
+    global Pool
+    
+    if None == Pool: return
+    
+    Pool.close()
+    Pool.join()
+    Pool = None
+
+#-------------------------------------------------------------------------------
+def initWorker(options):
+    global Options
+    
+    Options = options
+    
+    # interrupts are handled by the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+#-------------------------------------------------------------------------------
+def checkJob(job):
+    (iFileName, path, entry) = job
+    
+    if not entry: return False
+    
+    try:
+        oFileNames = [outputFileName(iFileName, path, target.dirName) for target in getTargets()]
+        
+        return isUpToDate(entry, hashFile(iFileName), oFileNames)
+    except EnvironmentError:
+        return False
 
 #-------------------------------------------------------------------------------
-def processFile(iFileName, path=""):
+def processJob(job):
+    (iFileName, path, entry) = job
+    
+    return runJob(processFile, iFileName, path, entry)
+
+#-------------------------------------------------------------------------------
+def bundleJob(job):
+    (iFileName, path) = job
+    
+    return runJob(bundleFile, iFileName, path)
+
+#-------------------------------------------------------------------------------
+def dependenciesJob(job):
+    (iFileName, path) = job
+    
+    # messages and failures are reported when the module is compiled
+    return runJob(dependenciesFile, iFileName, path)
+
+#-------------------------------------------------------------------------------
+def runJob(function, iFileName, path, *args):
+    global MessageBuffer
+    global FileStats
+    global FileErrors
+    global FileParse
+    
+    # messages, stats and errors are buffered and returned, to be reported
+    # by the main process
+    MessageBuffer = []
+    FileStats     = None
+    FileErrors    = None
+    failure       = []
+    result        = None
+    
+    if Options.stats or Options.statsFileName:
+        FileStats = Stats()
+        
+    if Options.allErrors:
+        FileErrors = []
+    
+    try:
+        result = function(iFileName, path, *args)
+    except CompileErrors, e:
+        failure = e.errors
+    except CompileError, e:
+        failure = [e]
+    except EnvironmentError, e:
+        failure = [CompileError(iFileName, None, e.strerror or str(e))]
+        
+    messages      = MessageBuffer
+    stats         = FileStats
+    MessageBuffer = None
+    FileStats     = None
+    FileErrors    = None
+    FileParse     = None
+    
+    return (messages, failure, result, stats)
+
+#-------------------------------------------------------------------------------
+def bundleFile(iFileName, path=""):
     baseName = os.path.basename(iFileName)[:-6]
-    oFileName = os.path.join(Options.dirName, path, baseName) + ".js"
     
-    # read the file
+    start = time.time()
+    with open(iFileName) as iFile:
+        contents = iFile.read()
+        
+    timePhase("read", start)
+    
+    # plain JavaScript modules are bundled as is
+    if iFileName.endswith(ExtensionJavaScript): return contents
+        
+    return compile(contents, iFileName, path, baseName, CompileOptions.fromOptions(Options))
+
+#-------------------------------------------------------------------------------
+def dependenciesFile(iFileName, path=""):
     with open(iFileName) as iFile:
         contents = iFile.read()
+        
+    info = ModuleInfo()
+    
+    # plain JavaScript modules only have their require() calls
+    if iFileName.endswith(ExtensionJavaScript):
+        for match in PatternRequireCall.finditer(contents):
+            info.addRequire(match.group(2))
+            
+        return info.getDependencies(moduleId(iFileName, path))
+    
+    # only the directives are needed, not the generated code
+    for directive in Directive.scan(iFileName, contents):
+        directive.addInfo(info)
+        
+    return info.getDependencies(moduleId(iFileName, path))
+
+#-------------------------------------------------------------------------------
+def processFile(iFileName, path="", entry=None):
+    global FileParse
+    
+    baseName = os.path.basename(iFileName)[:-6]
+    
+    # large files are streamed rather than read whole, except in watch mode, 
+    # where the last parse of the file is kept anyway
+    stream = os.path.getsize(iFileName) >= Options.streamSize and None == Parses
+    
+    # read the file
+    start = time.time()
+    if stream:
+        sourceHash = hashFile(iFileName)
+    else:
+        with open(iFileName) as iFile:
+            contents = iFile.read()
+            
+        sourceHash = hashContents(contents)
+        
+    timePhase("read", start)
+    
+    # in watch mode, the file's last parse is updated rather than replaced;
+    # it's only kept once the file compiles
+    if None != Parses:
+        FileParse = Parses.pop(iFileName, None) or ParsedFile()
+    
+    # the file is parsed at most once, however many targets it's compiled 
+    # for; only the code generation is repeated
+    directives   = None
+    dependencies = None
+    outputHashes = []
+    
+    # the output hashes of the .js files written, and compressed, by the 
+    # last build
+    outputs = []
+    gzipped = []
+    if entry:
+        outputs = entry.get("outputs") or [entry.get("output")]
+        
+        if entry.get("gzip", {}).get("level") == Options.gzipLevel:
+            gzipped = entry["gzip"]["outputs"]
+    
+    for index, target in enumerate(getTargets()):
+        lastHashes = (
+            outputs[index] if index < len(outputs) else None,
+            gzipped[index] if index < len(gzipped) else None
+        )
+        
+        (outputHash, targetDependencies, directives) = processTarget(iFileName, path, baseName, target, sourceHash, None if stream else contents, directives, lastHashes)
+        
+        outputHashes.append(outputHash)
+        if None == dependencies: dependencies = targetDependencies
+        
+    if None != FileParse and None != directives:
+        FileParse.finish()
+        Parses[iFileName] = FileParse
+        
+    entry = {
+        "source":  sourceHash,
+        "version": VERSION,
+        "options": buildSignature(),
+        "output":  outputsHash(outputHashes),
+        "outputs": outputHashes,
+        "deps":    dependencies
+    }
+    
+    if Options.gzip: entry["gzip"] = {"level": Options.gzipLevel, "outputs": outputHashes}
+    
+    return entry
+
+#-------------------------------------------------------------------------------
+def processTarget(iFileName, path, baseName, target, sourceHash, contents, directives, lastHashes=(None, None)):
+    oFileName = outputFileName(iFileName, path, target.dirName)
+    
+    # create output directory
+    oDir = os.path.dirname(oFileName)
+    if not os.path.exists(oDir):
+        try:
+            os.makedirs(oDir)
+        except OSError:
+            # another worker may have just created it
+            if not os.path.isdir(oDir): raise
+        
+    # compile the contents and write the output file, unless the same 
+    # module was compiled before with the same options, by any build
+    options = target.compileOptions(Options)
+    info    = ModuleInfo()
+    key     = None
+    cached  = None
+    
+    if Options.cacheDir:
+        key = cacheKey(target.signature(options), moduleId(iFileName, path), sourceHash)
+        
+        start  = time.time()
+        cached = readCache(key)
+        
+        timePhase("read", start)
+        
+        if None != FileStats: FileStats.addCount("cache hits" if cached else "cache misses")
+        
+    messageCount = len(MessageBuffer or [])
+    
+    (lastHash, gzipped) = lastHashes
+    
+    output = None
+    if None != cached:
+        output     = cached["contents"]
+        outputHash = cached["output"]
+        info.addLines(cached["lineNos"])
+        
+        for message in cached["messages"]:
+            emit(message)
+            
+    elif None == contents:
+        start      = time.time()
+        outputHash = processFileStream(iFileName, oFileName, path, baseName, target, options, info, lastHashes)
+        
+        timePhase("stream", start)
+    else:
+        if None == directives:
+            if None != FileParse: directives = FileParse.parse(contents, iFileName)
+            else:                 directives = parse(contents, iFileName)
+        
+        output = compileDirectives(directives, iFileName, options, info)
+        
+        if target.transport: output = wrapTransport(output, moduleId(iFileName, path))
+        if options.compact:  output = "%s\n%s" % (output, lineMapComment(oFileName))
+        
+        outputHash = hashContents(output)
+    
+    # the output of a module recompiled only because a module it depends
+    # on changed is usually the same, and is left untouched
+    if None != output:
+        start = time.time()
+        if isOutputUnchanged(oFileName, outputHash, lastHash):
+            verbose("module %s is unchanged in %s" % (moduleId(iFileName, path), oFileName))
+        else:
+            with open(oFileName, "w") as oFile:
+                oFile.write(output)
+            
+        start = timePhase("write", start)
+        
+        # compressed from the output in memory, unless the output is the
+        # same as when it was last compressed
+        if isGzipNeeded(oFileName, outputHash, gzipped): 
+            writeGzip(oFileName, output)
+            
+            timePhase("gzip", start)
+        
+    if options.compact: writeLineMap(iFileName, oFileName, info.lineNos)
+    
+    if None != cached:
+        dependencies = cached["deps"]
+    else:
+        dependencies = info.getDependencies(moduleId(iFileName, path))
+        
+        if None != key:
+            writeCache(key, oFileName, {
+                "output":   outputHash,
+                "deps":     dependencies,
+                "lineNos":  info.lineNos,
+                "messages": (MessageBuffer or [])[messageCount:]
+            })
+            
+    # messages from the directives are the same for each target
+    if None != MessageBuffer:
+        MessageBuffer[messageCount:] = [message for message in MessageBuffer[messageCount:] if message not in MessageBuffer[:messageCount]]
+    
+    log("generated module %s/%s in %s" % (path, baseName, oFileName))
+    
+    return (outputHash, dependencies, directives)
+
+#-------------------------------------------------------------------------------
+def processFileStream(iFileName, oFileName, path, baseName, target, options, info, lastHashes=(None, None)):
+    tFileName = oFileName + ".tmp"
+    gFileName = gzipFileName(oFileName) + ".tmp"
+    
+    # write to a temporary file, so a compile error leaves no partial output;
+    # with --gzip, the output is compressed as it's written
+    gFile = None
+    try:
+        with open(iFileName) as iFile:
+            with open(tFileName, "w") as tFile:
+                oFile = tFile
+                if Options.gzip: 
+                    gFile = open(gFileName, "wb")
+                    oFile = TeeFile(tFile, openGzip(gFile))
+                
+                if target.transport: oFile.write("%s " % (TransportStart % json.dumps(moduleId(iFileName, path))))
+                
+                compileStream(iFile, oFile, iFileName, path, baseName, options, info)
+                
+                if target.transport: oFile.write(TransportEnd)
+                if options.compact:  oFile.write("\n%s" % lineMapComment(oFileName))
+                
+                oFile.close()
+    except:
+        if None != gFile: gFile.close()
+        
+        if os.path.exists(tFileName): os.remove(tFileName)
+        if os.path.exists(gFileName): os.remove(gFileName)
+        raise
+        
+    (lastHash, gzipped) = lastHashes
+    
+    outputHash = hashFile(tFileName)
+    if isOutputUnchanged(oFileName, outputHash, lastHash): os.remove(tFileName)
+    else:                                                 os.rename(tFileName, oFileName)
+    
+    if None != gFile: 
+        gFile.close()
+        
+        if isGzipNeeded(oFileName, outputHash, gzipped): os.rename(gFileName, gzipFileName(oFileName))
+        else:                                            os.remove(gFileName)
+    
+    return outputHash
+
+#-------------------------------------------------------------------------------
+def isOutputUnchanged(oFileName, outputHash, lastHash):
+    if outputHash != lastHash: return False
+    
+    # the file may have been changed since the last build
+    try:
+        return hashFile(oFileName) == outputHash
+    except EnvironmentError:
+        return False
+
+#-------------------------------------------------------------------------------
+def gzipFileName(oFileName):
+    return "%s%s" % (oFileName, ExtensionGzip)
+
+#-------------------------------------------------------------------------------
+def isGzipNeeded(oFileName, outputHash, gzipped):
+    if not Options.gzip: return False
+    
+    return outputHash != gzipped or not os.path.exists(gzipFileName(oFileName))
+
+#-------------------------------------------------------------------------------
+def openGzip(file):
+
+    # no file name or time in the header, so the same output is always 
+    # compressed to the same bytes; closing it leaves file open
+    return gzip.GzipFile("", "wb", Options.gzipLevel, file, 0)
+
+#-------------------------------------------------------------------------------
+def writeGzip(oFileName, contents):
+    gFileName = gzipFileName(oFileName)
+    tFileName = gFileName + ".tmp"
+    
+    try:
+        with open(tFileName, "wb") as tFile:
+            gFile = openGzip(tFile)
+            gFile.write(contents)
+            gFile.close()
+    except:
+        if os.path.exists(tFileName): os.remove(tFileName)
+        raise
+            
+    os.rename(tFileName, gFileName)
+
+#-------------------------------------------------------------------------------
+class TeeFile:
+
+    #---------------------------------------------------------------------------
+    def __init__(self, *files):
+        self.files = files
+
+    #---------------------------------------------------------------------------
+    def write(self, data):
+        for file in self.files:
+            file.write(data)
+
+    #---------------------------------------------------------------------------
+    def close(self):
+        for file in self.files:
+            file.close()
+
+#-------------------------------------------------------------------------------
+def wrapTransport(contents, moduleId):
+
+    # the definition starts on the first line, so lines aren't moved
+    return "%s %s%s" % (TransportStart % json.dumps(moduleId), contents, TransportEnd)
+
+#-------------------------------------------------------------------------------
+def lineMapFileName(oFileName):
+    return "%s.map" % oFileName
+
+#-------------------------------------------------------------------------------
+def lineMapComment(oFileName):
+    return "//# sourceMappingURL=%s" % os.path.basename(lineMapFileName(oFileName))
 
-    # compile the contents
-    contents = compile(contents, iFileName, path, baseName)
+#-------------------------------------------------------------------------------
+def writeLineMap(iFileName, oFileName, lineNos):
+    sourceName = os.path.relpath(iFileName, os.path.dirname(oFileName) or ".")
+    sourceName = sourceName.replace(os.sep, "/")
+    
+    contents = json.dumps(lineMap(sourceName, os.path.basename(oFileName), lineNos), sort_keys=True)
+    
+    # like the output, an unchanged line map is left untouched
+    try:
+        with open(lineMapFileName(oFileName)) as mFile:
+            if mFile.read() == contents: return
+    except EnvironmentError:
+        pass
+    
+    with open(lineMapFileName(oFileName), "w") as mFile:
+        mFile.write(contents)
+
+#-------------------------------------------------------------------------------
+def lineMap(sourceName, fileName, lineNos):
+    
+    # a version 3 source map, mapping the start of each line of the output
+    # to the start of a line of the source
+    segments = []
+    lastLineNo = 0
+    for lineNo in lineNos:
+        segments.append("AA%sA" % encodeVLQ(lineNo - lastLineNo))
+        lastLineNo = lineNo
+        
+    return {
+        "version":  3,
+        "file":     fileName,
+        "sources":  [sourceName],
+        "names":    [],
+        "mappings": ";".join(segments)
+    }
+
+#-------------------------------------------------------------------------------
+Base64Digits = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+#-------------------------------------------------------------------------------
+def encodeVLQ(value):
+    
+    # the sign is kept in the lowest bit, then 5 bits per digit, lowest
+    # first, with 32 set on each digit but the last
+    if value < 0: value = (-value << 1) | 1
+    else:         value = value << 1
+    
+    digits = []
+    while True:
+        digit   = value & 31
+        value >>= 5
+        
+        if value: digit |= 32
+        digits.append(Base64Digits[digit])
+        
+        if not value: return "".join(digits)
+
+#-------------------------------------------------------------------------------
+def cacheKey(signature, moduleId, sourceHash):
+    key = "\n".join([VERSION, signature, moduleId, sourceHash])
+    
+    return hashContents(key)
+
+#-------------------------------------------------------------------------------
+def cacheFileName(key):
+    return os.path.join(Options.cacheDir, key[:2], key)
+
+#-------------------------------------------------------------------------------
+def readCache(key):
+    cFileName = cacheFileName(key)
+    
+    # a cache file is a line of JSON describing the output, then the output
+    try:
+        with open(cFileName) as cFile:
+            cached = json.loads(cFile.readline())
+            cached["contents"] = cFile.read()
+                
+    except (EnvironmentError, ValueError):
+        return None
+    
+    # the modification time of a cache file is the last time it was used
+    try:
+        os.utime(cFileName, None)
+    except EnvironmentError:
+        pass
+        
+    return cached
+
+#-------------------------------------------------------------------------------
+def writeCache(key, oFileName, cached):
+    cFileName = cacheFileName(key)
+    cDir      = os.path.dirname(cFileName)
+    
+    # other builds may be writing the same file; each writes its own 
+    # temporary file, and renaming it into place is atomic
+    try:
+        if not os.path.isdir(cDir):
+            try:
+                os.makedirs(cDir)
+            except OSError:
+                if not os.path.isdir(cDir): raise
+                
+        (fd, tFileName) = tempfile.mkstemp(".tmp", key, cDir)
+        try:
+            with os.fdopen(fd, "w") as tFile:
+                tFile.write("%s\n" % json.dumps(cached))
+                
+                with open(oFileName) as oFile:
+                    shutil.copyfileobj(oFile, tFile)
+                    
+            os.rename(tFileName, cFileName)
+        except:
+            os.remove(tFileName)
+            raise
+            
+    except EnvironmentError, e:
+        log("unable to write %s to the cache: %s" % (oFileName, e.strerror or e))
+
+#-------------------------------------------------------------------------------
+def trimCache(cacheDir, maxBytes):
+    files = []
+    total = 0
+    now   = time.time()
+    
+    for dirName in os.listdir(cacheDir):
+        cDir = os.path.join(cacheDir, dirName)
+        if not os.path.isdir(cDir): continue
+        
+        for fileName in os.listdir(cDir):
+            cFileName = os.path.join(cDir, fileName)
+            
+            try:
+                stat = os.stat(cFileName)
+                
+                # temporary files are left behind by builds which were killed
+                if fileName.endswith(".tmp"):
+                    if stat.st_mtime < now - CacheTempSeconds: os.remove(cFileName)
+                    continue
+                    
+            except OSError:
+                continue
+                
+            files.append((stat.st_mtime, stat.st_size, cFileName))
+            total += stat.st_size
+            
+    # remove the least recently used files until the cache is small enough
+    files.sort()
+    for (mtime, size, cFileName) in files:
+        if total <= maxBytes: break
+        
+        try:
+            os.remove(cFileName)
+        except OSError:
+            pass
+            
+        total -= size
+        
+    verbose("cache in %s is %d bytes" % (cacheDir, total))
+
+#-------------------------------------------------------------------------------
+def isUpToDate(entry, sourceHash, oFileNames):
+    if not entry:                          return False
+    if entry.get("version") != VERSION:    return False
+    if entry.get("source")  != sourceHash: return False
+    if entry.get("options") != buildSignature(): return False
+    
+    if Options.gzip:
+        if entry.get("gzip", {}).get("level") != Options.gzipLevel: return False
+        
+        for oFileName in oFileNames:
+            if not os.path.exists(gzipFileName(oFileName)): return False
+    
+    try:
+        return entry.get("output") == outputsHash([hashFile(oFileName) for oFileName in oFileNames])
+    except EnvironmentError:
+        return False
+
+#-------------------------------------------------------------------------------
+def buildSignature():
+    signature = CompileOptions.fromOptions(Options).signature()
+    
+    for target in Options.targets:
+        signature = "%s;target=%s:%s" % (signature, target.kind, target.dirName)
+        
+    return signature
+
+#-------------------------------------------------------------------------------
+def outputsHash(hashes):
+    if len(hashes) == 1: return hashes[0]
+    
+    return hashContents(",".join(hashes))
+
+#-------------------------------------------------------------------------------
+def hashContents(contents):
+    return hashlib.sha1(contents).hexdigest()
+
+#-------------------------------------------------------------------------------
+def hashFile(fileName):
+    hash = hashlib.sha1()
+    
+    with open(fileName) as file:
+        for block in iter(lambda: file.read(65536), ""):
+            hash.update(block)
+            
+    return hash.hexdigest()
+
+#-------------------------------------------------------------------------------
+def outputFileName(iFileName, path, dirName=None):
+    baseName = os.path.basename(iFileName)[:-6]
+    
+    if None == dirName: dirName = Options.dirName
+    
+    return os.path.join(dirName, path, baseName) + ExtensionJavaScript
+
+#-------------------------------------------------------------------------------
+def getTargets():
+    if Options.targets: return Options.targets
+    
+    return [Target(Options.emit, False, Options.dirName)]
+
+#-------------------------------------------------------------------------------
+def moduleId(iFileName, path):
+    baseName = os.path.splitext(os.path.basename(iFileName))[0]
+    
+    return "/".join(path.split(os.sep) + [baseName]).lstrip("/")
+
+#-------------------------------------------------------------------------------
+def readManifest():
+    mFileName = os.path.join(Options.dirName, ManifestName)
+    
+    try:
+        with open(mFileName) as mFile:
+            manifest = json.load(mFile)
+    except (EnvironmentError, ValueError):
+        return {}
+    
+    if not isinstance(manifest, dict): return {}
+    
+    return manifest.get("files", {})
+
+#-------------------------------------------------------------------------------
+def writeManifest(entries):
+    mFileName = os.path.join(Options.dirName, ManifestName)
+    
+    if not os.path.exists(Options.dirName):
+        os.makedirs(Options.dirName)
+    
+    manifest = {"version": VERSION, "files": entries}
+    
+    # write to a temporary file first, so a failed write leaves no partial manifest
+    with open(mFileName + ".tmp", "w") as mFile:
+        json.dump(manifest, mFile, indent=1, sort_keys=True)
+        
+    os.rename(mFileName + ".tmp", mFileName)
+
+#-------------------------------------------------------------------------------
+def writeDependencies(dFileName, jobs, manifest):
+    graph = {}
+    for (iFileName, path) in jobs:
+        entry = manifest.get(moduleId(iFileName, path), {})
+        graph[moduleId(iFileName, path)] = entry.get("deps", [])
+        
+    dependencies = {
+        "order":        topologicalSort(graph),
+        "dependencies": graph
+    }
+    
+    if dFileName == "-":
+        emit(json.dumps(dependencies, indent=1, sort_keys=True))
+        return
+        
+    with open(dFileName, "w") as dFile:
+        json.dump(dependencies, dFile, indent=1, sort_keys=True)
+
+#-------------------------------------------------------------------------------
+def topologicalSort(graph):
+    
+    # modules come after the modules they depend on; dependencies outside
+    # the graph are ignored, and cycles are broken where they are found
+    order    = []
+    visited  = set()
+    
+    def visit(node):
+        if node in visited: return
+        visited.add(node)
+        
+        for dependency in sorted(graph[node]):
+            if dependency in graph: visit(dependency)
+            
+        order.append(node)
+        
+    for node in sorted(graph):
+        visit(node)
+        
+    return order
+
+#-------------------------------------------------------------------------------
+def collectFiles(iFileNames, dirs=None):
+    jobs = []
+    
+    excludes = []
+    if Options and Options.excludes:
+        excludes = [("", pattern) for pattern in Options.excludes]
+    
+    for iFileName in iFileNames:
+        if os.path.isdir(iFileName):
+            collectDir(iFileName, jobs, "", dirs, excludes, set())
+        else:
+            jobs.append((iFileName, ""))
+            if None != dirs: dirs.append(os.path.dirname(iFileName) or ".")
+            
+    return jobs
+
+#-------------------------------------------------------------------------------
+def collectDir(iDirName, jobs, path="", dirs=None, excludes=None, ancestors=None):
+    verbose("collectDir:  %s path: %s" % (iDirName, path))
+    
+    # a directory which is its own ancestor is reached through a symlink
+    stat = os.stat(iDirName)
+    key  = (stat.st_dev, stat.st_ino)
+    if None != ancestors:
+        if key in ancestors:
+            log("skipping directory %s: symbolic link cycle" % iDirName)
+            return
+            
+        ancestors = ancestors | set([key])
+    
+    if None != dirs: dirs.append(iDirName)
+    
+    entries = listDir(iDirName, stat.st_mtime)
+    
+    # the patterns in an ignore file are relative to its directory
+    excludes = excludes or []
+    if [IgnoreName, False] in entries:
+        excludes = excludes + [(path, pattern) for pattern in readIgnoreFile(os.path.join(iDirName, IgnoreName))]
+
+    # a .js file next to a .scoop file is the compiled module, not a plain
+    # JavaScript one
+    scoopNames = set(entry for (entry, isDir) in entries if entry.endswith(ExtensionScoop))
+
+    # entries are sorted, so the job order is stable
+    for (entry, isDir) in entries:
+        fullName = os.path.join(iDirName, entry)
+        relName  = os.path.join(path, entry)
+        
+        if isExcluded(relName, excludes): continue
+        
+        # recursively collect subdirectories
+        if isDir:
+            if not entry.startswith("."):
+                collectDir(fullName, jobs, relName, dirs, excludes, ancestors)
+            continue
+        
+        # if it's a scoop file, collect it
+        if entry.endswith(ExtensionScoop) and isIncluded(relName):
+            jobs.append((fullName, path))
+            
+        # bundles also get the plain JavaScript modules
+        elif entry.endswith(ExtensionJavaScript) and isBundling():
+            if entry[:-len(ExtensionJavaScript)] + ExtensionScoop not in scoopNames:
+                jobs.append((fullName, path))
+
+#-------------------------------------------------------------------------------
+def listDir(iDirName, mtime):
+
+    # the cached listing is used while the directory is unchanged; the
+    # listings of bundles have the .js files too, so are kept apart
+    key = os.path.abspath(iDirName)
+    if isBundling(): key += os.sep + ExtensionJavaScript
+    
+    if None != Listings:
+        listing = Listings.get(key)
+        if listing and listing[0] == mtime: return listing[1]
+
+    # only the subdirectories, .scoop files and ignore file are kept, and
+    # the .js files for bundles
+    extensions = (ExtensionScoop,)
+    if isBundling(): extensions = (ExtensionScoop, ExtensionJavaScript)
+    
+    entries = []
+    if scandir:
+        for entry in scandir(iDirName):
+            isDir = entry.is_dir()
+            
+            if isDir or entry.name.endswith(extensions) or entry.name == IgnoreName:
+                entries.append([entry.name, isDir])
+    else:
+        for name in os.listdir(iDirName):
+            isDir = os.path.isdir(os.path.join(iDirName, name))
+            
+            if isDir or name.endswith(extensions) or name == IgnoreName:
+                entries.append([name, isDir])
+            
+    entries.sort()
+    
+    if None != Listings: Listings[key] = [mtime, entries]
+    
+    return entries
+
+#-------------------------------------------------------------------------------
+def isBundling():
+    return bool(Options and Options.bundleFileName)
+
+#-------------------------------------------------------------------------------
+def readIgnoreFile(iFileName):
+    patterns = []
+    
+    with open(iFileName) as iFile:
+        for line in iFile:
+            line = line.strip()
+            if line == "" or line.startswith("#"): continue
+            
+            patterns.append(line)
+            
+    return patterns
+
+#-------------------------------------------------------------------------------
+def isExcluded(relName, excludes):
+    for (path, pattern) in excludes:
+        name = relName
+        if path: name = os.path.relpath(relName, path)
+        
+        if matchesPattern(name, pattern): return True
+        
+    return False
+
+#-------------------------------------------------------------------------------
+def isIncluded(relName):
+    if not Options or not Options.includes: return True
+    
+    for pattern in Options.includes:
+        if matchesPattern(relName, pattern): return True
+        
+    return False
+
+#-------------------------------------------------------------------------------
+def matchesPattern(relName, pattern):
+    
+    # patterns with a / match the path from the directory, others match
+    # just the name, at any depth
+    relName = relName.replace(os.sep, "/")
+    
+    if "/" in pattern:
+        return fnmatch.fnmatchcase(relName, pattern.strip("/"))
+        
+    return fnmatch.fnmatchcase(posixpath.basename(relName), pattern)
+
+#-------------------------------------------------------------------------------
+def readListings():
+    global Listings
+    
+    lFileName = os.path.join(Options.dirName, ListingsName)
+    
+    try:
+        with open(lFileName) as lFile:
+            Listings = json.load(lFile)
+    except (EnvironmentError, ValueError):
+        Listings = {}
+        
+    if not isinstance(Listings, dict) or Listings.get("version") != VERSION:
+        Listings = {}
+        
+    Listings = Listings.get("dirs", {})
+
+#-------------------------------------------------------------------------------
+def writeListings():
+    lFileName = os.path.join(Options.dirName, ListingsName)
+    
+    if not os.path.exists(Options.dirName):
+        os.makedirs(Options.dirName)
+    
+    # write to a temporary file first, so a failed write leaves no partial listings
+    with open(lFileName + ".tmp", "w") as lFile:
+        json.dump({"version": VERSION, "dirs": Listings}, lFile, sort_keys=True)
+        
+    os.rename(lFileName + ".tmp", lFileName)
+
+#-------------------------------------------------------------------------------
+def watch(iFileNames, manifest, failures):
+    global Parses
+    
+    # the last parse of each file compiled while watching, so that only 
+    # the directives of the file which were edited are compiled again
+    Parses = {}
+    
+    dirs     = []
+    snapshot = snapshotFiles(collectFiles(iFileNames, dirs))
+    watcher  = InotifyWatcher.create() or PollingWatcher()
+    
+    watcher.watchDirs(dirs)
+    log("watching for changes (%s)" % watcher.name)
+    
+    # the errors of each file which currently fails to compile
+    failed = dict((failure[0].fileName, failure) for failure in failures)
+    
+    try:
+        while True:
+            watcher.wait(None)
+            
+            # let a burst of changes settle before looking at the files
+            while watcher.wait(WatchDebounceSeconds): pass
+            
+            dirs     = []
+            previous = snapshot
+            snapshot = snapshotFiles(collectFiles(iFileNames, dirs))
+            
+            watcher.watchDirs(dirs)
+            
+            if snapshot == previous: continue
+            
+            # recompile the added, modified and deleted files' dependents
+            changed = set()
+            for iFileName, (path, stamp) in snapshot.items():
+                if previous.get(iFileName, (None, None))[1] == stamp: continue
+                changed.add(moduleId(iFileName, path))
+                
+            for iFileName, (path, stamp) in previous.items():
+                if iFileName not in snapshot: changed.add(moduleId(iFileName, path))
+                
+            changed = addDependents(changed, manifest)
+            
+            for iFileName, (path, stamp) in sorted(snapshot.items()):
+                if moduleId(iFileName, path) not in changed: continue
+                
+                (messages, failure, entry, _) = processJob((iFileName, path, manifest.get(moduleId(iFileName, path))))
+                
+                for message in messages:
+                    emit(message)
+                    
+                for compileError in failure:
+                    logError(compileError)
+                    
+                if failure: failed[iFileName] = failure
+                else:       failed.pop(iFileName, None)
+                
+                if entry:   manifest[moduleId(iFileName, path)] = entry
+                
+            # remove the output of the deleted files
+            for iFileName, (path, stamp) in sorted(previous.items()):
+                if iFileName in snapshot: continue
+                
+                for target in getTargets():
+                    oFileName = outputFileName(iFileName, path, target.dirName)
+                    if os.path.exists(oFileName):
+                        os.remove(oFileName)
+                        log("removed module %s in %s" % (moduleId(iFileName, path), oFileName))
+                        
+                    if os.path.exists(lineMapFileName(oFileName)):
+                        os.remove(lineMapFileName(oFileName))
+                        
+                    if os.path.exists(gzipFileName(oFileName)):
+                        os.remove(gzipFileName(oFileName))
+                    
+                manifest.pop(moduleId(iFileName, path), None)
+                failed.pop(iFileName, None)
+                Parses.pop(iFileName, None)
+                
+            writeManifest(manifest)
+            
+            if Options.errorsFileName:
+                writeErrors(Options.errorsFileName, [failed[iFileName] for iFileName in sorted(failed)])
+            
+    except KeyboardInterrupt:
+        pass
+
+#-------------------------------------------------------------------------------
+def snapshotFiles(jobs):
+    snapshot = {}
+    
+    for (iFileName, path) in jobs:
+        try:
+            stat = os.stat(iFileName)
+        except OSError:
+            continue
+            
+        snapshot[iFileName] = (path, (stat.st_mtime, stat.st_size))
+        
+    return snapshot
+
+#-------------------------------------------------------------------------------
+class PollingWatcher:
+
+    name = "polling"
+
+    #---------------------------------------------------------------------------
+    def watchDirs(self, dirs):
+        pass
+
+    #---------------------------------------------------------------------------
+    def wait(self, timeout):
+        if None == timeout:
+            time.sleep(WatchPollSeconds)
+            return True
+            
+        time.sleep(timeout)
+        return False
+
+#-------------------------------------------------------------------------------
+class InotifyWatcher:
+
+    name = "inotify"
+    
+    # IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | 
+    # IN_CREATE | IN_DELETE
+    mask = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def create():
+        try:
+            import ctypes
+            import ctypes.util
+            
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd   = libc.inotify_init()
+        except (ImportError, OSError, AttributeError):
+            return None
+            
+        if fd < 0: return None
+        
+        return InotifyWatcher(libc, fd)
+
+    #---------------------------------------------------------------------------
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd   = fd
+
+    #---------------------------------------------------------------------------
+    def watchDirs(self, dirs):
+        # adding a watch for an already watched directory is harmless
+        for dirName in dirs:
+            self.libc.inotify_add_watch(self.fd, dirName, InotifyWatcher.mask)
+
+    #---------------------------------------------------------------------------
+    def wait(self, timeout):
+        (ready, _, _) = select.select([self.fd], [], [], timeout)
+        if not ready: return False
+        
+        # the events themselves aren't needed, just the wake up
+        os.read(self.fd, 65536)
+        return True
+
+#-------------------------------------------------------------------------------
+def serve(iFile, oFile):
+    
+    # one JSON request per line in, one JSON response per line out
+    while True:
+        line = iFile.readline()
+        if not line: break
+        if not line.strip(): continue
+        
+        try:
+            request = json.loads(line)
+        except ValueError, e:
+            response = {"error": {"message": "invalid request: %s" % e}}
+        else:
+            response = handleRequest(request)
+        
+        oFile.write(json.dumps(response))
+        oFile.write("\n")
+        oFile.flush()
+
+#-------------------------------------------------------------------------------
+def serveSocket(socketName):
+    import SocketServer
+    
+    class Handler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            serve(self.rfile, self.wfile)
+            
+    if os.path.exists(socketName): os.remove(socketName)
+    
+    server = SocketServer.UnixStreamServer(socketName, Handler)
+    
+    # clean up the socket when terminated, as well as when interrupted
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    log("serving compile requests on %s" % socketName)
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socketName)
+
+#-------------------------------------------------------------------------------
+def handleRequest(request):
+    global MessageBuffer
+    
+    #   {
+    #     "id":          returned as is in the response
+    #     "fileName":    name of the .scoop file
+    #     "source":      contents of the .scoop file; read from fileName if missing
+    #     "path":        module path of the file (default: "")
+    #     "outFileName": file to write the output (and line map) to, rather than 
+    #                    returning it
+    #     "options":     CompileOptions settings, eg {"staticSuper": true}
+    #   }
+    response = {}
+    
+    MessageBuffer = []
+    
+    try:
+        checkRequest(request)
+        
+        if "id" in request: response["id"] = request["id"]
+        
+        iFileName = request.get("fileName", "<source>")
+        path      = request.get("path", "")
+        baseName  = os.path.basename(iFileName)
+        
+        if baseName.endswith(ExtensionScoop): baseName = baseName[:-len(ExtensionScoop)]
+        
+        if "source" in request:
+            source = request["source"].encode("utf-8")
+        else:
+            with open(iFileName) as iFile:
+                source = iFile.read()
+                
+        options  = CompileOptions(**request.get("options", {}))
+        
+        if options.emit not in EmitModes:
+            raise TypeError("unknown emit mode: %s" % json.dumps(options.emit))
+            
+        info     = ModuleInfo()
+        contents = compile(source, iFileName, path, baseName, options, info)
+        
+        if "outFileName" in request:
+            oFileName = request["outFileName"]
+            
+            if options.compact:
+                contents = "%s\n%s" % (contents, lineMapComment(oFileName))
+                writeLineMap(iFileName, oFileName, info.lineNos)
+                
+            with open(oFileName, "w") as oFile:
+                oFile.write(contents)
+        else:
+            response["output"] = contents.decode("utf-8")
+            
+            if options.compact:
+                response["map"] = lineMap(iFileName, baseName + ".js", info.lineNos)
+            
+    except CompileError, e:
+        response["error"] = e.toJSON()
+        response["error"]["lineNo"] = e.lineNo
+    except EnvironmentError, e:
+        response["error"] = {"fileName": e.filename, "message": e.strerror or str(e)}
+    except (TypeError, UnicodeError), e:
+        response["error"] = {"message": "invalid request: %s" % e}
+        
+    response["messages"] = MessageBuffer
+    MessageBuffer        = None
+    
+    return response
+
+#-------------------------------------------------------------------------------
+def checkRequest(request):
+    if not isinstance(request, dict):
+        raise TypeError("expecting a JSON object")
+        
+    for key in ["fileName", "source", "path", "outFileName"]:
+        if key in request and not isinstance(request[key], basestring):
+            raise TypeError("expecting a string for %s" % key)
+            
+    if "options" in request and not isinstance(request["options"], dict):
+        raise TypeError("expecting an object for options")
+
+#-------------------------------------------------------------------------------
+def compile(source, iFileName, path, baseName, options=None, info=None):
+    directives = parse(source, iFileName)
+    
+    return compileDirectives(directives, iFileName, options, info)
+
+#-------------------------------------------------------------------------------
+def parse(source, iFileName):
+
+    # get the directives from the source
+    start      = time.time()
+    directives = Directive.scan(iFileName, source)
+    start      = timePhase("scan", start)
+    
+    calculateBodies(directives, source.split("\n"))
+    
+    timePhase("bodies", start)
+    
+    return directives
+
+#-------------------------------------------------------------------------------
+def calculateBodies(directives, lines):
+    
+    # calculate the body and comments for the directives
+    prevDirective = None
+    for index, directive in enumerate(directives):
+    
+        nextDirective = None
+        if index != len(directives) - 1: 
+            nextDirective = directives[index+1]
+
+        directive.calculateBodyAndComments(lines, prevDirective, nextDirective)        
+        
+        prevDirective = directive
+
+#-------------------------------------------------------------------------------
+def compileDirectives(directives, iFileName, options=None, info=None):
+
+    # return the compiled content
+    start    = time.time()
+    contents = "\n".join(generate(iFileName, directives, options or CompileOptions(), info))
+    
+    timePhase("generate", start)
+    
+    raiseErrors()
+    
+    return contents
+
+#-------------------------------------------------------------------------------
+def compileStream(iFile, oFile, iFileName, path, baseName, options=None, info=None):
+    
+    # write each directive's output as soon as it's generated
+    separator = ""
+    for chunk in generate(iFileName, streamDirectives(iFile, iFileName), options or CompileOptions(), info):
+        oFile.write(separator)
+        oFile.write(chunk)
+        separator = "\n"
+        
+    raiseErrors()
+
+#-------------------------------------------------------------------------------
+def streamDirectives(iFile, iFileName):
+    
+    # lines from the start of the current directive's comments; the line 
+    # just before a directive is part of that directive's comments, as in
+    # calculateBodyAndComments()
+    window    = []
+    base      = 0
+    directive = None
+    
+    for lineNo, line in enumerate(readLines(iFile)):
+        if not Directive.patternLine.match(line):
+            window.append(line)
+            continue
+            
+        nextDirective = Directive.fromLine(iFileName, line, lineNo)
+        if None == nextDirective:
+            reportError(CompileError(iFileName, lineNo, "unknown directive found: '%s'" % line))
+            
+            window.append(line)
+            continue
+        
+        commentsStart = 0
+        if None != directive:
+            commentsStart = max(directive.lineNo + 1, lineNo - 1)
+            
+            directive.setRange(window, base, directive.commentsStart, commentsStart)
+            yield directive
+            
+            window = window[commentsStart - base:]
+            base   = commentsStart
+        
+        window.append(line)
+        nextDirective.commentsStart = commentsStart
+        
+        directive = nextDirective
+        
+    if directive:
+        directive.setRange(window, base, directive.commentsStart, base + len(window))
+        yield directive
+
+#-------------------------------------------------------------------------------
+def readLines(iFile):
+    
+    # the same lines as iFile.read().split("\n"), without reading it all
+    line = ""
+    for line in iFile:
+        if line.endswith("\n"):
+            yield line[:-1]
+        else:
+            yield line
+            
+    if line.endswith("\n") or line == "":
+        yield ""
+
+#-------------------------------------------------------------------------------
+def generate(iFileName, directives, options, info=None):
+
+    # the output for a directive is yielded once the next directive is 
+    # seen, since the next one's line carries this one's ending suffix
+    classDirective = None
+    lastDirective  = None
+    lastLine       = None
+    lastSuffix     = None
+    
+    # with --emit=static, the members of the current class, defined all
+    # at once in front of the next directive which isn't a member
+    className = None
+    members   = None
+    
+    # with --emit=lazy, the class whose definition is being deferred
+    lazyClass = None
+    
+    # the methods of the classes defined so far, for flattening mixins of
+    # them; None for a class once it uses a mixin which isn't known
+    methods = {}
+    
+    for directive in directives:
+        line   = directive.compile()
+        suffix = directive.endingSuffix()
+        
+        if options.compact and not directive.hasCode(): line = ""
+        
+        if None != info: directive.addInfo(info)
+        
+        if None != FileStats: FileStats.addCount("directive %s" % directive.getKind())
+        
+        if directive.getClassName(): 
+            className          = directive.getClassName()
+            methods[className] = []
+            
+        elif directive.getMixinName():
+            line = flattenMixin(iFileName, directive, className, methods) or line
+            
+        elif directive.isMember() and directive.table == "methods" and None != methods.get(className):
+            methodName = directive.getMethodName()
+            
+            # scooj.addMethod() would throw this at runtime; ClassMembers 
+            # reports the ones defined again in the same batch of members, 
+            # but not the ones from a flattened mixin or an earlier batch
+            if options.emit == "static" and methodName in methods[className]:
+                if None == members or not members.isDefined(directive):
+                    message = "method is already defined in class: %s.%s" % (className, methodName)
+                    reportError(CompileError(iFileName, directive.lineNo, message))
+            else:
+                methods[className].append(methodName)
+        
+        if options.emit == "static":
+            if directive.isMember() and None != className:
+                if None == members: members = ClassMembers(className)
+                
+                line   = directive.compileStatic(members.add(iFileName, directive))
+                suffix = "}; "
+                
+            elif None != members:
+                line    = "%s%s" % (members.toJS(), line)
+                members = None
+                
+        elif options.emit == "lazy":
+        
+            # a class's members and mixins are deferred along with it; 
+            # those after some other directive are deferred separately
+            grouped = directive.isMember() or directive.getMixinName()
+            
+            prefix = ""
+            if None != lazyClass and not grouped:
+                prefix    = lazyClass.toJS()
+                lazyClass = None
+                
+            if directive.getClassName():
+                line      = directive.compileLazy()
+                lazyClass = LazyClass(className)
+                
+            elif grouped and None != className:
+                if None == lazyClass:
+                    lazyClass = LazyClass(className, True)
+                    line      = "scooj.extendLazyClass(module, %s, function() { %s" % (className, line)
+                    
+                lazyClass.add(directive)
+                
+            line = "%s%s" % (prefix, line)
+        
+        if None == lastDirective:
+            line = ";var scooj = require('scooj'); %s" % line
+        else:
+            line = "%s%s" % (lastSuffix, line)
+            
+            if options.compact: checkCompactBody(iFileName, lastDirective)
+            
+            if lastDirective.getClassName(): classDirective = lastDirective
+            chunk = generateDirective(lastDirective, lastLine, classDirective, options, info)
+            
+            if None != chunk: yield chunk
+            
+        lastDirective = directive
+        lastLine      = line
+        lastSuffix    = suffix
+        
+    if lastDirective:
+        suffix = lastSuffix
+        if None != members:   suffix = "%s%s" % (suffix, members.toJS())
+        if None != lazyClass: suffix = "%s%s" % (suffix, lazyClass.toJS())
+        if suffix == "":      suffix = ";"
+        
+        if lastDirective.getClassName(): classDirective = lastDirective
+        chunk = generateDirective(lastDirective, lastLine, classDirective, options, info, suffix)
+        
+        if None != chunk: yield chunk
+
+#-------------------------------------------------------------------------------
+def flattenMixin(iFileName, directive, className, methods):
+    mixinName    = directive.getMixinName()
+    classMethods = methods.get(className)
+    mixinMethods = methods.get(mixinName)
+    
+    # only classes defined earlier in the module are known; anything else
+    # is left to scooj.useMixin() at runtime
+    if None == classMethods or None == mixinMethods:
+        if None != className: methods[className] = None
+        return None
+        
+    duplicates = [methodName for methodName in mixinMethods if methodName in classMethods]
+    for methodName in duplicates:
+        message = "method is already defined in class: %s.%s" % (className, methodName)
+        reportError(CompileError(iFileName, directive.lineNo, message))
+        
+    if len(duplicates):
+        methods[className] = None
+        return None
+            
+    classMethods.extend(mixinMethods)
+    
+    if None != FileStats: FileStats.addCount("flattened mixins")
+    
+    return directive.compileFlattened(className, mixinMethods)
+
+#-------------------------------------------------------------------------------
+def generateDirective(directive, line, classDirective, options, info=None, suffix=None):
+    
+    # in watch mode, the output of a directive unchanged since the file's
+    # last compile is reused; compact line numbers are kept relative to 
+    # the start of the directive's comments
+    key = None
+    if None != FileParse:
+        key    = FileParse.chunkKey(directive, line, classDirective, options, suffix)
+        cached = FileParse.getChunk(key)
+        
+        if None != cached:
+            (chunk, offsets) = cached
+            if None != info: info.addLines(directive.commentsStart + offset for offset in offsets)
+            
+            if None != FileStats: FileStats.addCount("reused directives")
+            
+            return chunk
+            
+    (chunk, lineNos) = generateChunk(directive, line, classDirective, options, suffix)
+    
+    if None != info: info.addLines(lineNos)
+    
+    if None != key:
+        FileParse.putChunk(key, chunk, [lineNo - directive.commentsStart for lineNo in lineNos])
+        
+    return chunk
+
+#-------------------------------------------------------------------------------
+def generateChunk(directive, line, classDirective, options, suffix=None):
+    comments = directive.getComments()
+    body     = directive.getBody()
+    
+    if None != suffix: body.append(suffix)
+    
+    body = "\n".join(body)
+    
+    # replace super invocations
+    if directive.isSuperReplaceable():
+        className      = "???"
+        superclassName = None
+        
+        if classDirective:
+            className = classDirective.getClassName()
+            
+            if options.staticSuper:
+                superclassName = classDirective.getStaticSuperclassName()
+            
+        start = time.time()
+        body  = replaceSuperInvocations(className, directive.getMethodName(), body, superclassName)
+        
+        timePhase("super", start)
+        
+    if options.compact:
+        lines = compactDirective(directive, line, comments, body.split("\n"))
+        if not len(lines): return (None, [])
+        
+        return ("\n".join(text for (text, lineNo) in lines), [lineNo for (text, lineNo) in lines])
+    
+    comments = "\n".join(comments)
+    
+    if directive.hasComments(): comments = "%s\n" % comments
+    if directive.hasBody() or None != suffix: body = "\n%s" % body
+    
+    return ("%s%s%s" % (comments, line, body), [])
+
+#-------------------------------------------------------------------------------
+def compactDirective(directive, line, comments, body):
+    lines = []
+    
+    # lines which start inside a string, template literal or comment are
+    # kept as they are
+    literalLines = findLiteralLines("\n".join(comments))
+    
+    # the comments of a directive are usually comments, but can be the 
+    # last line of the previous directive's body
+    for index, text in enumerate(comments):
+        if index not in literalLines:
+            text = text.strip()
+            if isCompactable(text): continue
+        
+        lines.append((text, directive.commentsStart + index))
+    
+    # the ending suffix of the previous directive is joined to the next
+    # line kept, when the directive itself generates no code
+    glue = ""
+    if directive.hasCode():
+        lines.append((line.strip(), directive.lineNo))
+    else:
+        glue = line.strip()
+        
+    # the ending suffix of the last directive follows the last line of 
+    # the file
+    lastLineNo   = max(directive.lineNo, directive.bodyEnd - 1)
+    literalLines = findLiteralLines("\n".join(body))
+    for index, text in enumerate(body):
+        if index not in literalLines:
+            text = text.strip()
+            if isCompactable(text): continue
+        
+        if glue: 
+            text = "%s %s" % (glue, text)
+            glue = ""
+        
+        lines.append((text, min(directive.lineNo + 1 + index, lastLineNo)))
+        
+    if glue: lines.append((glue, directive.lineNo))
+    
+    return lines
+
+#-------------------------------------------------------------------------------
+def isCompactable(text):
+    return text == "" or text.startswith("//")
+
+#-------------------------------------------------------------------------------
+def findLiteralLines(text):
+    
+    # the indexes of the lines of text which start inside a string, 
+    # template literal or comment, including the index of the line after
+    # the text, if a literal carries on there; only template literals,
+    # block comments and strings with an escaped newline span lines
+    text += "\n "
+    if "`" not in text and "/*" not in text and "\\\n" not in text: return set()
+    
+    indexes = set()
+    lineNo  = 0
+    counted = 0
+    for (kind, start, end, match) in scanBody(text, None, True):
+        if kind != "literal": continue
+        
+        newline = text.find("\n", start, end - 1)
+        while newline != -1:
+            lineNo += text.count("\n", counted, newline + 1)
+            counted = newline + 1
+            
+            indexes.add(lineNo)
+            newline = text.find("\n", newline + 1, end - 1)
+            
+    return indexes
+
+#-------------------------------------------------------------------------------
+def checkCompactBody(iFileName, directive):
+    
+    # the line after a directive's body is compacted as the next 
+    # directive's comments, so it can't be kept as it is when a string, 
+    # template literal or comment of the body carries on there
+    text = directive.getLineAfter()
+    if None == text or (text == text.strip() and not isCompactable(text)): return
+    
+    body = directive.getBody()
+    if len(body) not in findLiteralLines("\n".join(body)): return
+    
+    message = "with --compact, a string, template literal or comment can't carry on into the line before a directive"
+    reportError(CompileError(iFileName, directive.bodyEnd, message))
+
+#-------------------------------------------------------------------------------
+# the parts of a method body which matter for finding literals and super 
+# invocations; the code between them is skipped in one piece.  The super
+# token looks behind its s rather than in front of it, so the search only
+# looks behind where an s is found
+#-------------------------------------------------------------------------------
+PatternBodyToken = re.compile(r"""
+      (?P<string>   "(?:[^"\\\n]|\\.)*"? | '(?:[^'\\\n]|\\.)*'? )
+    | (?P<template> ` )
+    | (?P<comment>  //[^\n]* | /\*.*?(?:\*/|\Z) )
+    | (?P<slash>    / )
+    | (?P<super>    s (?<![\w$]s) uper (?:\.(?P<superName>[\w$]*))? \( (?P<superEmpty>\s*\))? )
+""", re.X | re.S)
+
+# in a template literal substitution, the braces are needed too, to find
+# the one which ends it
+PatternSubstitutionToken = re.compile(PatternBodyToken.pattern + r"""
+    | (?P<brace>    [{}] )
+""", re.X | re.S)
+
+# the text of a template literal, up to its end or its next substitution
+PatternTemplateText = re.compile(r"(?:[^`\\$]|\\.?|\$(?!\{))*(?:`|\$\{|\Z)", re.S)
+
+PatternRegExpLiteral = re.compile(r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[\w$]*")
+
+PatternLastWord = re.compile(r"[\w$]+$")
+
+# the modules a plain JavaScript module requires
+PatternRequireCall = re.compile(r"""(?<![\w$.])require\s*\(\s*(["'])([^"'\n]+)\1\s*\)""")
+
+# after these, a / starts a regular expression literal rather than a division
+KeywordsBeforeRegExp = set("return typeof instanceof in of new delete void throw case do else".split())
+
+#-------------------------------------------------------------------------------
+def replaceSuperInvocations(className, methodName, methodBody, superclassName=None):
+    if "super" not in methodBody: return methodBody
+    
+    # one scan over the body, copying strings, comments and regular 
+    # expression literals untouched and rewriting the super invocations:
+    #    super()      -> className.$super(this, methodName)
+    #    super(...    -> className.$super(this, methodName,...
+    #    super.x()    -> className.$super(this, "x")
+    #    super.x(...  -> className.$super(this, "x", ...
+    # or, given a superclassName, calling the superclass functions directly:
+    #    super()      -> superclassName.prototype.methodName.call(this)
+    #    super(...    -> superclassName.prototype.methodName.call(this, ...
+    #    super.x()    -> superclassName.prototype.x.call(this)
+    #    super.x(...  -> superclassName.prototype.x.call(this, ...
+    # where superclassName.prototype.methodName is superclassName itself
+    # for the class's constructor
+    if superclassName:
+        superFunction = superclassName
+        if methodName:
+            superFunction = "%s.prototype.%s" % (superclassName, methodName)
+            
+    if not methodName:
+        methodName = "null"
+    else:
+        methodName = '"%s"' % methodName
+    
+    # only the super invocations change; the rest is copied in pieces
+    # between them, and nothing after the last one needs to be scanned
+    parts    = []
+    copied   = 0
+    rewrites = 0
+    
+    for (kind, start, end, match) in scanBody(methodBody, methodBody.rfind("super")):
+        if kind != "super": continue
+        
+        name = match.group("superName")
+        
+        if superclassName:
+            if None == name:
+                token = "%s.call(this" % superFunction
+            else:
+                token = "%s.prototype.%s.call(this" % (superclassName, name)
+                
+            if match.group("superEmpty"): token += ")"
+            else:                         token += ", "
+            
+        elif None == name:
+            token = "%s.$super(this, %s" % (className, methodName)
+            
+            if match.group("superEmpty"): token += ")"
+            else:                         token += ","
+        else:
+            token = '%s.$super(this, "%s"' % (className, name)
+            
+            if match.group("superEmpty"): token += ")"
+            else:                         token += ", "
+            
+        rewrites += 1
+        
+        parts.append(methodBody[copied:start])
+        parts.append(token)
+        copied = end
+            
+    parts.append(methodBody[copied:])
+    
+    if None != FileStats: FileStats.addCount("super rewrites", rewrites)
+    
+    return "".join(parts)
+
+#-------------------------------------------------------------------------------
+def scanBody(body, stop=None, literals=False):
+    
+    # yields the super invocations of a method body as 
+    # ("super", start, end, match), and, given literals, its strings, 
+    # template literal text, comments and regular expression literals as 
+    # ("literal", start, end, None), up to the first token after stop
+    if None == stop: stop = len(body)
+    
+    pos = 0
+    
+    # what came before the current token, ignoring spaces and comments: 
+    # code, or a token which is a value (so a / after it is a division) 
+    # or isn't
+    lastCode = ""
+    lastKind = None
+    
+    # the depth of the braces in each template literal substitution being
+    # scanned, innermost last
+    substitutions = []
+    
+    search = PatternBodyToken.search
+    while pos <= stop:
+        match = search(body, pos)
+        if not match: break
+            
+        start = match.start()
+        kind  = match.lastgroup
+        
+        # a string is a value whatever came before it
+        if kind == "string":
+            pos      = match.end()
+            lastKind = "value"
+            if literals: yield ("literal", start, pos, None)
+            continue
+        
+        if start > pos:
+            code = body[pos:start]
+            
+            if not code.isspace():
+                lastCode = code
+                lastKind = "code"
+            
+        pos = match.end()
+        
+        if kind == "comment":
+            if literals: yield ("literal", start, pos, None)
+            
+        elif kind == "super":
+            
+            # not a super invocation, but a property named super
+            if lastKind == "code" and lastCode.rstrip().endswith("."):
+                lastKind = "operator"
+                continue
+                
+            if match.group("superEmpty"): lastKind = "value"
+            else:                         lastKind = "operator"
+            
+            yield ("super", start, pos, match)
+            
+        elif kind == "slash":
+            literal = None
+            if not isValueBefore(lastCode, lastKind):
+                literal = PatternRegExpLiteral.match(body, start)
+                
+            if literal:
+                pos      = literal.end()
+                lastKind = "value"
+                if literals: yield ("literal", start, pos, None)
+            else:
+                lastKind = "operator"
+                
+        elif kind == "brace" and body[start] == "{":
+            substitutions[-1] += 1
+            lastKind = "operator"
+            
+        elif kind == "brace" and substitutions[-1]:
+            substitutions[-1] -= 1
+            lastKind = "operator"
+            
+        # the text of a template literal, from its start or the end of one
+        # of its substitutions, up to its end or its next substitution,
+        # which is scanned as code
+        else:
+            if kind == "brace": substitutions.pop()
+            
+            pos = PatternTemplateText.match(body, pos).end()
+            if literals: yield ("literal", start, pos, None)
+            
+            if body.startswith("${", pos - 2):
+                substitutions.append(0)
+                lastKind = "operator"
+            else:
+                lastKind = "value"
+                
+            if substitutions: search = PatternSubstitutionToken.search
+            else:             search = PatternBodyToken.search
+
+#-------------------------------------------------------------------------------
+def isValueBefore(lastCode, lastKind):
+    if lastKind != "code": return lastKind == "value"
+    
+    # a name or number, other than a keyword, or a closing bracket
+    lastCode = lastCode.rstrip()
+    
+    word = PatternLastWord.search(lastCode[-16:])
+    if word: return word.group() not in KeywordsBeforeRegExp
+    
+    return lastCode[-1] in ")]"
+
+#-------------------------------------------------------------------------------
+class CompileOptions:
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def fromOptions(options):
+        return CompileOptions(
+            staticSuper = options.staticSuper,
+            emit        = options.emit,
+            compact     = options.compact
+        )
+
+    #---------------------------------------------------------------------------
+    def __init__(self, staticSuper=False, emit="default", compact=False):
+        self.staticSuper = staticSuper
+        self.emit        = emit
+        self.compact     = compact
+
+    #---------------------------------------------------------------------------
+    def signature(self):
+        items = sorted(self.__dict__.items())
+        
+        return ",".join("%s=%s" % (key, val) for (key, val) in items)
+
+#-------------------------------------------------------------------------------
+class Target:
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def fromArg(arg):
+        (kind, sep, dirName) = arg.partition(":")
+        
+        if not sep or not dirName: 
+            raise ValueError("expecting KIND:DIR for --target: '%s'" % arg)
+        
+        # an emit mode, "transport", or both, like "static+transport"
+        emits     = []
+        transport = False
+        for word in kind.split("+"):
+            if word == "transport":  transport = True
+            elif word in EmitModes:  emits.append(word)
+            else:
+                raise ValueError("unknown --target kind: '%s'" % word)
+                
+        if len(emits) > 1: 
+            raise ValueError("more than one emit mode for --target: '%s'" % arg)
+            
+        return Target((emits or ["default"])[0], transport, dirName)
+
+    #---------------------------------------------------------------------------
+    def __init__(self, emit, transport, dirName):
+        self.emit      = emit
+        self.transport = transport
+        self.dirName   = dirName
+        
+        self.kind = emit
+        if transport: self.kind = "%s+transport" % emit
+
+    #---------------------------------------------------------------------------
+    def compileOptions(self, options):
+        return CompileOptions(
+            staticSuper = options.staticSuper,
+            emit        = self.emit,
+            compact     = options.compact
+        )
+
+    #---------------------------------------------------------------------------
+    def signature(self, options):
+        signature = options.signature()
+        if self.transport: signature = "%s,transport=True" % signature
+        
+        return signature
+
+#-------------------------------------------------------------------------------
+class ParsedFile:
+
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.lines      = None
+        self.directives = None
+        self.chunks     = {}
+        self.nextChunks = {}
+
+    #---------------------------------------------------------------------------
+    def parse(self, source, iFileName):
+        lines = source.split("\n")
+        
+        if None == self.directives:
+            directives = parse(source, iFileName)
+        else:
+            start      = time.time()
+            directives = self.reparse(lines, iFileName)
+            start      = timePhase("scan", start)
+            
+            calculateBodies(directives, lines)
+            
+            timePhase("bodies", start)
+            
+        self.lines      = lines
+        self.directives = directives
+        
+        return directives
+
+    #---------------------------------------------------------------------------
+    def reparse(self, lines, iFileName):
+        oldLines = self.lines
+        
+        # the lines before and after the edit are the same as last time
+        limit  = min(len(lines), len(oldLines))
+        prefix = 0
+        while prefix < limit and lines[prefix] == oldLines[prefix]:
+            prefix += 1
+            
+        suffix = 0
+        while suffix < limit - prefix and lines[-1 - suffix] == oldLines[-1 - suffix]:
+            suffix += 1
+            
+        # so only the directive lines in between are parsed again; the 
+        # directives after the edit are moved by the lines added or removed
+        oldEnd = len(oldLines) - suffix
+        end    = len(lines)    - suffix
+        delta  = end - oldEnd
+        
+        before = [directive for directive in self.directives if directive.lineNo < prefix]
+        after  = [directive for directive in self.directives if directive.lineNo >= oldEnd]
+        
+        for directive in after:
+            directive.lineNo += delta
+            
+        edited = []
+        for lineNo in xrange(prefix, end):
+            line = lines[lineNo]
+            if not Directive.patternLine.match(line): continue
+            
+            directive = Directive.fromLine(iFileName, line, lineNo)
+            if None == directive:
+                reportError(CompileError(iFileName, lineNo, "unknown directive found: '%s'" % line))
+                continue
+                
+            edited.append(directive)
+            
+        verbose("reparsed lines %d to %d of %s" % (prefix + 1, end, iFileName))
+        
+        return before + edited + after
+
+    #---------------------------------------------------------------------------
+    def chunkKey(self, directive, line, classDirective, options, suffix):
+        className      = None
+        superclassName = None
+        
+        if classDirective:
+            className      = classDirective.getClassName()
+            superclassName = classDirective.getStaticSuperclassName()
+            
+        comments = tuple(directive.getComments())
+        body     = tuple(directive.getBody())
+        
+        # the emit mode only changes the line and suffix
+        return (directive.__class__, comments, line, body, suffix, className, superclassName, options.staticSuper, options.compact)
+
+    #---------------------------------------------------------------------------
+    def getChunk(self, key):
+        chunk = self.nextChunks.get(key) or self.chunks.get(key)
+        
+        if None != chunk: self.nextChunks[key] = chunk
+        
+        return chunk
+
+    #---------------------------------------------------------------------------
+    def putChunk(self, key, chunk, offsets):
+        self.nextChunks[key] = (chunk, offsets)
+
+    #---------------------------------------------------------------------------
+    def finish(self):
+    
+        # only the output of the directives in the file now is kept
+        self.chunks     = self.nextChunks
+        self.nextChunks = {}
+
+#-------------------------------------------------------------------------------
+class ModuleInfo:
+
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.requires = []
+        self.lineNos  = []
+
+    #---------------------------------------------------------------------------
+    def addRequire(self, moduleName):
+        self.requires.append(moduleName)
+
+    #---------------------------------------------------------------------------
+    def addLines(self, lineNos):
+        self.lineNos.extend(lineNos)
+
+    #---------------------------------------------------------------------------
+    def getDependencies(self, moduleId):
+        
+        # relative module names are relative to the requiring module
+        dependencies = set()
+        for moduleName in self.requires:
+            if moduleName.startswith("."):
+                moduleName = posixpath.join(posixpath.dirname(moduleId), moduleName)
+                moduleName = posixpath.normpath(moduleName)
+                
+            dependencies.add(moduleName)
+            
+        return sorted(dependencies)
+
+#-------------------------------------------------------------------------------
+class ClassMembers:
+
+    #---------------------------------------------------------------------------
+    def __init__(self, className):
+        self.className = className
+        self.members   = []
+        self.defined   = set()
+
+    #---------------------------------------------------------------------------
+    def add(self, iFileName, directive):
+        methodName = directive.getMethodName()
+        key        = (directive.table, methodName)
+        
+        # scooj.addMethod() would throw this at runtime
+        if key in self.defined:
+            message = "method is already defined in class: %s.%s" % (self.className, methodName)
+            reportError(CompileError(iFileName, directive.lineNo, message))
+            
+        self.defined.add(key)
+        
+        varName = directive.getVariableName(self.className)
+        self.members.append((directive, varName))
+        
+        return varName
+
+    #---------------------------------------------------------------------------
+    def isDefined(self, directive):
+        return (directive.table, directive.getMethodName()) in self.defined
+
+    #---------------------------------------------------------------------------
+    def toJS(self):
+    
+        # the same metadata scooj.addMethod() sets up, then one 
+        # Object.defineProperties() each for the prototype and the class
+        parts       = []
+        descriptors = {False: ([], {}), True: ([], {})}
+        
+        for (directive, varName) in self.members:
+            methodName = directive.getMethodName()
+            
+            parts.append("%s._scooj = {owningClass: %s, isMethod: true, isStatic: %s, isGetter: %s, isSetter: %s}; " % (
+                varName, self.className, 
+                json.dumps(directive.isStatic), json.dumps(directive.isGetter), json.dumps(directive.isSetter)
+            ))
+            parts.append("%s.signature = module.id + \".%s()\"; " % (varName, methodName))
+            parts.append("%s._scooj.%s.%s = %s; " % (self.className, directive.table, methodName, varName))
+            
+            (names, byName) = descriptors[directive.isStatic]
+            
+            # a later member replaces an earlier one of the same name, 
+            # except that a getter and setter share a property
+            descriptor = byName.get(methodName)
+            if None == descriptor:
+                names.append(methodName)
+            
+            if   directive.isGetter: key = "get"
+            elif directive.isSetter: key = "set"
+            else:                    key = "value"
+            
+            if None == descriptor or "value" in descriptor or key == "value":
+                descriptor = {}
+                
+            descriptor[key]    = varName
+            byName[methodName] = descriptor
+            
+        for (isStatic, target) in [(False, "%s.prototype" % self.className), (True, self.className)]:
+            (names, byName) = descriptors[isStatic]
+            if not len(names): continue
+            
+            properties = []
+            for name in names:
+                descriptor = byName[name]
+                
+                if "value" in descriptor:
+                    fields = "value: %s, writable: true" % descriptor["value"]
+                else:
+                    fields = ", ".join("%s: %s" % (key, descriptor[key]) for key in ["get", "set"] if key in descriptor)
+                    
+                properties.append("%s: {%s, enumerable: true, configurable: true}" % (name, fields))
+                
+            parts.append("Object.defineProperties(%s, {%s}); " % (target, ", ".join(properties)))
+            
+        return "".join(parts)
+
+#-------------------------------------------------------------------------------
+class LazyClass:
+
+    #---------------------------------------------------------------------------
+    def __init__(self, className, extension=False):
+        self.className   = className
+        self.extension   = extension
+        self.staticNames = []
+
+    #---------------------------------------------------------------------------
+    def add(self, directive):
+        if not directive.isMember(): return
+        
+        methodName = directive.getMethodName()
+        
+        if directive.isStatic and methodName not in self.staticNames:
+            self.staticNames.append(methodName)
+
+    #---------------------------------------------------------------------------
+    def toJS(self):
+    
+        # the end of the function which defines the class, or more of its
+        # members, and the static members the stub passes on to the class
+        result = "return %s " % self.className
+        if self.extension: result = ""
+        
+        return "%s}, %s); " % (result, json.dumps(self.staticNames))
+
+#-------------------------------------------------------------------------------
+class Stats:
+
+    # super is timed as part of generate; stream is read, scan, bodies,
+    # generate, write and gzip for streamed files
+    phases = ["read", "scan", "bodies", "generate", "super", "stream", "write", "gzip"]
+
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.start  = time.time()
+        self.times  = {}
+        self.counts = {}
+        self.files  = []
+
+    #---------------------------------------------------------------------------
+    def addTime(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0) + seconds
+
+    #---------------------------------------------------------------------------
+    def addCount(self, name, count=1):
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    #---------------------------------------------------------------------------
+    def getTotal(self):
+        return sum(seconds for (phase, seconds) in self.times.items() if phase != "super")
+
+    #---------------------------------------------------------------------------
+    def addFile(self, fileName, stats):
+        if not stats: return
+        
+        for (phase, seconds) in stats.times.items():
+            self.addTime(phase, seconds)
+            
+        for (name, count) in stats.counts.items():
+            self.addCount(name, count)
+            
+        self.files.append((stats.getTotal(), fileName, stats.times))
+
+    #---------------------------------------------------------------------------
+    def toJSON(self, top):
+        slowest = sorted(self.files, key=lambda file: (-file[0], file[1]))[:top]
+        
+        return {
+            "files":   len(self.files),
+            "seconds": time.time() - self.start,
+            "phases":  self.times,
+            "counts":  self.counts,
+            "slowest": [{"file": fileName, "seconds": total, "phases": times} for (total, fileName, times) in slowest]
+        }
+
+    #---------------------------------------------------------------------------
+    def toTable(self, top):
+        stats = self.toJSON(top)
+        lines = []
+        
+        lines.append("%d files in %.3f sec" % (stats["files"], stats["seconds"]))
+        lines.append("")
+        lines.append("%-24s %10s" % ("phase", "sec"))
+        for phase in Stats.phases:
+            if phase in self.times:
+                lines.append("%-24s %10.3f" % (phase, self.times[phase]))
+            
+        lines.append("")
+        lines.append("%-24s %10s" % ("count", ""))
+        for name in sorted(self.counts):
+            lines.append("%-24s %10d" % (name, self.counts[name]))
+            
+        lines.append("")
+        lines.append("%-10s %s" % ("sec", "slowest files"))
+        for file in stats["slowest"]:
+            lines.append("%-10.3f %s" % (file["seconds"], file["file"]))
+            
+        return lines
+
+#-------------------------------------------------------------------------------
+def reportStats(stats):
+    # printed even with --quiet, since they were asked for
+    if Options.stats:
+        for line in stats.toTable(Options.statsTop):
+            emit(line)
+            
+    if Options.statsFileName:
+        with open(Options.statsFileName, "w") as sFile:
+            json.dump(stats.toJSON(Options.statsTop), sFile, indent=1, sort_keys=True)
+
+#-------------------------------------------------------------------------------
+def timePhase(phase, start):
+    now = time.time()
     
-    # create output directory
-    oDir = os.path.dirname(oFileName)
-    if not os.path.exists(oDir):
-        os.makedirs(oDir)
-        
-    # write output file
-    with open(oFileName, "w") as oFile:
-        oFile.write(contents)
+    if None != FileStats: FileStats.addTime(phase, now - start)
     
-    log("generated module %s/%s in %s" % (path, baseName, oFileName))
+    return now
 
 #-------------------------------------------------------------------------------
-def processDir(iDirName, path=""):
-    verbose("processDir:  %s path: %s" % (iDirName, path))
+class CompileError(Exception):
 
-    # get entries in directory
-    for entry in os.listdir(iDirName):
-        fullName = os.path.join(iDirName, entry)
+    #---------------------------------------------------------------------------
+    def __init__(self, fileName, lineNo, message):
+        Exception.__init__(self, fileName, lineNo, message)
         
-        # recursively process subdirectories
-        if os.path.isdir(fullName):
-            if not entry.startswith("."):
-                processDir(fullName, os.path.join(path, entry))
-            continue
+        self.fileName = fileName
+        self.lineNo   = lineNo
+        self.message  = message
+
+    #---------------------------------------------------------------------------
+    def __str__(self):
+        if None == self.lineNo: return "%s: %s" % (self.fileName, self.message)
+        
+        return "%s:%d: %s" % (self.fileName, self.lineNo + 1, self.message)
+
+    #---------------------------------------------------------------------------
+    def toJSON(self):
+        result = {"fileName": self.fileName, "message": self.message}
         
-        # if it's a scoop file, process it
-        if entry.endswith(ExtensionScoop):
-            processFile(fullName, path)
+        if None != self.lineNo: result["line"] = self.lineNo + 1
+        
+        return result
 
 #-------------------------------------------------------------------------------
-def compile(source, iFileName, path, baseName):
+class CompileErrors(Exception):
 
-    # split file into lines
-    lines = source.split("\n")
+    #---------------------------------------------------------------------------
+    def __init__(self, errors):
+        Exception.__init__(self, errors)
+        
+        self.errors = errors
 
-    # initialize directive list    
-    directives = []
-    
-    # get the directives from the lines
-    patternDirective = re.compile(r"^[\w\$\._@]+")
-    for lineNo, line in enumerate(lines):
-        if patternDirective.match(line):
-            directive = Directive.fromLine(iFileName, line, lineNo)
-            if None == directive:
-                errorFile(iFileName, lineNo, "unknown directive found: '%s'" % line)
-            
-            directives.append(directive)
-            
-    # calculate the body and comments for the directives
-    prevDirective = None
-    for index, directive in enumerate(directives):
-    
-        nextDirective = None
-        if index != len(directives) - 1: 
-            nextDirective = directives[index+1]
+    #---------------------------------------------------------------------------
+    def __str__(self):
+        return "\n".join(str(compileError) for compileError in self.errors)
 
-        directive.calculateBodyAndComments(lines, prevDirective, nextDirective)        
-        
-        prevDirective = directive
+#-------------------------------------------------------------------------------
+def reportError(compileError):
+
+    # with --all-errors, compiling carries on after an error, and the 
+    # errors are raised together at the end
+    if None == FileErrors: raise compileError
     
-    # compile the directives
-    firstDirective = True
-    lastDirective  = None
-    for directive in directives:
-        directive.compile()
-        
-        if firstDirective:
-            firstDirective = False
-            directive.line = ";var scooj = require('scooj'); %s" % directive.line
-        else:
-            directive.line = "%s%s" % (lastDirective.endingSuffix(), directive.line)
-            
-        lastDirective = directive
-        
-    if lastDirective:
-        suffix = lastDirective.endingSuffix()
-        if suffix == "": suffix = ";"
-        lastDirective.body.append(suffix)    
-        
-    # generate the output
-    lines = []
-    className = "???"
-    for directive in directives:
-        comments = "\n".join(directive.comments)
-        body     = "\n".join(directive.body)
-        line     = directive.line
-        
-        # replace super invocations
-        if directive.getClassName(): className = directive.getClassName()
-        
-        if directive.isSuperReplaceable():
-            body = replaceSuperInvocations(className, directive.getMethodName(), body)
-        
-        if len(directive.comments): comments = "%s\n" % comments
-        if len(directive.body):     body     = "\n%s" % body
-        lines.append("%s%s%s" % (comments, line, body))
+    FileErrors.append(compileError)
 
-    # return the compiled content
-    return "\n".join(lines)        
+#-------------------------------------------------------------------------------
+def raiseErrors():
+    if FileErrors: raise CompileErrors(list(FileErrors))
 
 #-------------------------------------------------------------------------------
-def replaceSuperInvocations(className, methodName, methodBody):
-    pattern1 = re.compile(r"([^\w\$])super\(\s*\)")
-    pattern2 = re.compile(r"([^\w\$])super\(")
-    pattern3 = re.compile(r"([^\w\$])super\.([\w\$]*)\(\s*\)")
-    pattern4 = re.compile(r"([^\w\$])super\.([\w\$]*)\(")
+class Directive(object):
     
-    if not methodName:
-        methodName = "null"
-    else:
-        methodName = '"%s"' % methodName
+    byKeyword = {}
     
-    methodBody = pattern1.sub(r'\1' + className + r'.$super(this, ' + methodName + ')', methodBody)
-    methodBody = pattern2.sub(r'\1' + className + r'.$super(this, ' + methodName + ',', methodBody)
-    methodBody = pattern3.sub(r'\1' + className + r'.$super(this, "\2")'              , methodBody)
-    methodBody = pattern4.sub(r'\1' + className + r'.$super(this, "\2", '             , methodBody)
+    # a directive line starts with a keyword in column 1
+    patternLine = re.compile(r"^([\w\$\._@]+).*$", re.M)
     
-    return methodBody
+    # a directive only keeps the groups matched from its line, and offsets
+    # into a list of lines shared by all the directives of a file:
+    #    comments: lines[commentsStart : lineNo]
+    #    body:     lines[lineNo + 1 : bodyEnd]
+    # where the offsets are line numbers, and base is the line number of
+    # lines[0]
+    __slots__ = ("groups", "lineNo", "lines", "base", "commentsStart", "bodyEnd")
 
-#-------------------------------------------------------------------------------
-class Directive:
-    
-    classes = []
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def register(classes):
+        for cls in classes:
+            Directive.byKeyword.setdefault(cls.keyword, []).append(cls)
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def scan(fileName, source):
+        directives = []
+        lineNo     = 0
+        lineStart  = 0
+        
+        # one pass over the source finds the directive lines; the keyword
+        # selects the few directive classes that could match the line
+        for match in Directive.patternLine.finditer(source):
+            lineNo    += source.count("\n", lineStart, match.start())
+            lineStart  = match.start()
+            
+            line      = match.group(0)
+            directive = Directive.fromKeyword(fileName, line, lineNo, match.group(1))
+            if None == directive:
+                reportError(CompileError(fileName, lineNo, "unknown directive found: '%s'" % line))
+                continue
+                
+            directives.append(directive)
+            
+        return directives
 
     #---------------------------------------------------------------------------
     @staticmethod
     def fromLine(fileName, line, lineNo):
-        for cls in Directive.classes:
+        match = Directive.patternLine.match(line)
+        if not match: return None
+        
+        return Directive.fromKeyword(fileName, line, lineNo, match.group(1))
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def fromKeyword(fileName, line, lineNo, keyword):
+        for cls in Directive.byKeyword.get(keyword, []):
             match = cls.match(line)
             if match:
                 return cls(fileName, line, lineNo, match)
@@ -192,12 +2655,12 @@ class Directive:
         
     #---------------------------------------------------------------------------
     def __init__(self, fileName, line, lineNo, match):
-        self.fileName = fileName
-        self.line     = line
-        self.lineNo   = lineNo
-        self.match    = match
-        self.comments = []
-        self.body     = []
+        self.groups        = match.groups()
+        self.lineNo        = lineNo
+        self.lines         = None
+        self.base          = 0
+        self.commentsStart = lineNo
+        self.bodyEnd       = lineNo + 1
 
     #---------------------------------------------------------------------------
     def compile(self):
@@ -210,60 +2673,113 @@ class Directive:
     #---------------------------------------------------------------------------
     def calculateBodyAndComments(self, lines, prevDirective, nextDirective):
         if None == prevDirective:
-            self.comments = lines[0 : self.lineNo]
+            commentsStart = 0
         else:
-            prevBodyIndex = prevDirective.lineNo + len(prevDirective.body)
-            self.comments = lines[prevBodyIndex+1 : self.lineNo]
+            commentsStart = prevDirective.bodyEnd
             
         if None == nextDirective:
-            self.body = lines[self.lineNo + 1 : ]
-            return
+            bodyEnd = len(lines)
+        else:
+            bodyEnd = max(self.lineNo + 1, nextDirective.lineNo - 1)
             
-        self.body = lines[self.lineNo + 1 : nextDirective.lineNo - 1]
+        self.setRange(lines, 0, commentsStart, bodyEnd)
+
+    #---------------------------------------------------------------------------
+    def setRange(self, lines, base, commentsStart, bodyEnd):
+        self.lines         = lines
+        self.base          = base
+        self.commentsStart = commentsStart
+        self.bodyEnd       = bodyEnd
+
+    #---------------------------------------------------------------------------
+    def getComments(self): return self.lines[self.commentsStart - self.base : self.lineNo - self.base]
+    def getBody(self):     return self.lines[self.lineNo + 1 - self.base : self.bodyEnd - self.base]
+    def hasComments(self): return self.commentsStart < self.lineNo
+    def hasBody(self):     return self.lineNo + 1 < self.bodyEnd
+
+    #---------------------------------------------------------------------------
+    def getLineAfter(self):
+        if self.bodyEnd - self.base >= len(self.lines): return None
+        
+        return self.lines[self.bodyEnd - self.base]
 
     #---------------------------------------------------------------------------
-    def getClassName(self):       return None
-    def getMethodName(self):      return None
-    def isSuperReplaceable(self): return False
+    def getKind(self):                   return self.__class__.__name__[len("Directive"):]
+    def addInfo(self, info):             pass
+    def getClassName(self):              return None
+    def getStaticSuperclassName(self):   return None
+    def getMethodName(self):             return None
+    def isSuperReplaceable(self):        return False
+    def isMember(self):                  return False
+    def hasCode(self):                   return True
+    def getMixinName(self):              return None
 
 #-------------------------------------------------------------------------------
 class DirectiveClass(Directive):
 
+    __slots__    = ()
+    keyword      = "class"
     matchPattern = re.compile("^class\s+([\w$_]+)\s*(\(.*\))?\s*(<\s*(\S+))?\s*$")
 
+    patternPlainName = re.compile(r"^[\w$]+(\.[\w$]+)*$")
+
     #---------------------------------------------------------------------------
     def __init__(self, fileName, line, lineNo, match):
         Directive.__init__(self, fileName, line, lineNo, match)
 
     #---------------------------------------------------------------------------
     def compile(self):
-        className      = self.match.group(1)
-        methodParms    = self.match.group(2)
-        superclassName = self.match.group(4)
+        return "var %s = %s" % (self.groups[0], self.compileDefClass("%s"))
+            
+    #---------------------------------------------------------------------------
+    def compileLazy(self):
+        className = self.groups[0]
         
-        self.className = className
+        # a stub constructor, and a function which defines the class when 
+        # it's first used; the stub may be the superclass
+        line = "var %s = scooj.defLazyClass(module, function %s() { return scooj.constructLazy(%s, this, arguments) }, function() { %s = %s"
+        return line % (className, className, className, className, self.compileDefClass("scooj.loadClass(%s)"))
+            
+    #---------------------------------------------------------------------------
+    def compileDefClass(self, superclassFormat):
+        className      = self.groups[0]
+        methodParms    = self.groups[1]
+        superclassName = self.groups[3]
         
         if not methodParms: methodParms = "()"
         
         if not superclassName:
             superclassText = ""
         else:
-            superclassText = "%s, " % superclassName
+            superclassText = "%s, " % (superclassFormat % superclassName)
 
-        self.line = "var %s = scooj.defClass(module, %sfunction %s%s {" 
-        self.line = self.line % (className, superclassText, className, methodParms)
+        line = "scooj.defClass(module, %sfunction %s%s {" 
+        return line % (superclassText, className, methodParms)
             
     #---------------------------------------------------------------------------
     def endingSuffix(self):
         return "}); "
 
     #---------------------------------------------------------------------------
-    def getClassName(self):       return self.className
+    def getStaticSuperclassName(self):
+        superclassName = self.groups[3]
+    
+        # only a plain (dotted) name can be safely put in front of .prototype;
+        # anything else, like [Animal][0], goes through $super
+        if not superclassName: return None
+        if not DirectiveClass.patternPlainName.match(superclassName): return None
+        
+        return superclassName
+
+    #---------------------------------------------------------------------------
+    def getClassName(self):       return self.groups[0]
     def isSuperReplaceable(self): return True
         
 #-------------------------------------------------------------------------------
 class DirectiveMixin(Directive):
 
+    __slots__    = ()
+    keyword      = "mixin"
     matchPattern = re.compile("^mixin\s+(\S+)\s*$")
 
     #---------------------------------------------------------------------------
@@ -272,175 +2788,154 @@ class DirectiveMixin(Directive):
 
     #---------------------------------------------------------------------------
     def compile(self):
-        extensionName  = self.match.group(1)
+        extensionName  = self.groups[0]
 
-        self.line = "scooj.useMixin(module, %s)" 
-        self.line = self.line % (extensionName)
-        
-#-------------------------------------------------------------------------------
-class DirectiveStaticMethod(Directive):
-
-    matchPattern = re.compile("^static\s+method\s+([\w$_]+)\s*(\(.*\))?\s*$")
-
-    #---------------------------------------------------------------------------
-    def __init__(self, fileName, line, lineNo, match):
-        Directive.__init__(self, fileName, line, lineNo, match)
+        line = "scooj.useMixin(module, %s)" 
+        return line % (extensionName)
 
     #---------------------------------------------------------------------------
-    def compile(self):
-        methodName  = self.match.group(1)
-        methodParms = self.match.group(2)
-        
-        self.methodName = methodName
+    def compileFlattened(self, className, methodNames):
+        extensionName = self.groups[0]
         
-        if not methodParms: methodParms = "()"
+        # what scooj.useMixin() does, for a class whose methods are known
+        statements = ["%s._scooj.mixins.push(%s)" % (className, extensionName)]
+        for methodName in methodNames:
+            statement = "%s.prototype.%s = %s._scooj.methods.%s = %s._scooj.methods.%s"
+            statements.append(statement % (className, methodName, className, methodName, extensionName, methodName))
         
-        self.line = "scooj.defStaticMethod(module, function %s%s {" 
-        self.line = self.line % (methodName, methodParms)
-            
-    #---------------------------------------------------------------------------
-    def endingSuffix(self):
-        return "}); "
+        return "; ".join(statements)
 
     #---------------------------------------------------------------------------
-    def getMethodName(self):  return self.methodName
+    def getMixinName(self): return self.groups[0]
         
 #-------------------------------------------------------------------------------
-class DirectiveStaticGetter(Directive):
+class DirectiveMember(Directive):
 
-    matchPattern = re.compile("^static\s+getter\s+([\w$_]+)\s*$")
+    __slots__ = ()
     
+    # the scooj function which defines the member, the _scooj table it's 
+    # kept in, and the kind of member it is
+    defFunction = None
+    table       = None
+    isStatic    = False
+    isGetter    = False
+    isSetter    = False
+
     #---------------------------------------------------------------------------
     def __init__(self, fileName, line, lineNo, match):
         Directive.__init__(self, fileName, line, lineNo, match)
 
     #---------------------------------------------------------------------------
     def compile(self):
-        methodName  = self.match.group(1)
-        
-        self.methodName = methodName
-        
-        self.line = "scooj.defStaticGetter(module, function %s() {" 
-        self.line = self.line % (methodName)
+        return "scooj.%s(module, %s" % (self.defFunction, self.compileFunction())
             
     #---------------------------------------------------------------------------
-    def endingSuffix(self):
-        return "}); "
-
-    #---------------------------------------------------------------------------
-    def getMethodName(self):  return self.methodName
-        
-#-------------------------------------------------------------------------------
-class DirectiveStaticSetter(Directive):
-
-    matchPattern = re.compile("^static\s+setter\s+([\w$_]+)\s*(\(.*\))\s*$")
-
-    #---------------------------------------------------------------------------
-    def __init__(self, fileName, line, lineNo, match):
-        Directive.__init__(self, fileName, line, lineNo, match)
-
+    def compileStatic(self, varName):
+        return "var %s = %s" % (varName, self.compileFunction())
+            
     #---------------------------------------------------------------------------
-    def compile(self):
-        methodName  = self.match.group(1)
-        methodParms = self.match.group(2)
+    def compileFunction(self):
+        methodName  = self.groups[0]
+        methodParms = None
         
-        self.methodName = methodName
+        if len(self.groups) > 1: methodParms = self.groups[1]
+        if not methodParms:      methodParms = "()"
         
-        self.line = "scooj.defStaticSetter(module, function %s%s {" 
-        self.line = self.line % (methodName, methodParms)
+        return "function %s%s {" % (methodName, methodParms)
             
     #---------------------------------------------------------------------------
     def endingSuffix(self):
         return "}); "
 
     #---------------------------------------------------------------------------
-    def getMethodName(self):  return self.methodName
+    def getVariableName(self, className):
+        return "__%s$%s$%s" % (className, self.table, self.groups[0])
+
+    #---------------------------------------------------------------------------
+    def getMethodName(self):  return self.groups[0]
+    def isMember(self):       return True
         
 #-------------------------------------------------------------------------------
-class DirectiveMethod(Directive):
+class DirectiveStaticMethod(DirectiveMember):
 
-    matchPattern = re.compile("^method\s+([\w$_]+)\s*(\(.*\))?\s*$")
-
-    #---------------------------------------------------------------------------
-    def __init__(self, fileName, line, lineNo, match):
-        Directive.__init__(self, fileName, line, lineNo, match)
+    __slots__    = ()
+    keyword      = "static"
+    matchPattern = re.compile("^static\s+method\s+([\w$_]+)\s*(\(.*\))?\s*$")
+    
+    defFunction  = "defStaticMethod"
+    table        = "staticMethods"
+    isStatic     = True
+        
+#-------------------------------------------------------------------------------
+class DirectiveStaticGetter(DirectiveMember):
 
-    #---------------------------------------------------------------------------
-    def compile(self):
-        methodName  = self.match.group(1)
-        methodParms = self.match.group(2)
+    __slots__    = ()
+    keyword      = "static"
+    matchPattern = re.compile("^static\s+getter\s+([\w$_]+)\s*$")
+    
+    defFunction  = "defStaticGetter"
+    table        = "staticGetters"
+    isStatic     = True
+    isGetter     = True
         
-        self.methodName = methodName
+#-------------------------------------------------------------------------------
+class DirectiveStaticSetter(DirectiveMember):
 
-        if not methodParms: methodParms = "()"
+    __slots__    = ()
+    keyword      = "static"
+    matchPattern = re.compile("^static\s+setter\s+([\w$_]+)\s*(\(.*\))\s*$")
+    
+    defFunction  = "defStaticSetter"
+    table        = "staticSetters"
+    isStatic     = True
+    isSetter     = True
         
-        self.line = "scooj.defMethod(module, function %s%s {" 
-        self.line = self.line % (methodName, methodParms)
-            
-    #---------------------------------------------------------------------------
-    def endingSuffix(self):
-        return "}); "
+#-------------------------------------------------------------------------------
+class DirectiveMethod(DirectiveMember):
+
+    __slots__    = ()
+    keyword      = "method"
+    matchPattern = re.compile("^method\s+([\w$_]+)\s*(\(.*\))?\s*$")
+    
+    defFunction  = "defMethod"
+    table        = "methods"
 
     #---------------------------------------------------------------------------
-    def getMethodName(self):      return self.methodName
     def isSuperReplaceable(self): return True
         
 #-------------------------------------------------------------------------------
-class DirectiveGetter(Directive):
+class DirectiveGetter(DirectiveMember):
 
+    __slots__    = ()
+    keyword      = "getter"
     matchPattern = re.compile("^getter\s+([\w$_]+)\s*$")
+    
+    defFunction  = "defGetter"
+    table        = "getters"
+    isGetter     = True
 
     #---------------------------------------------------------------------------
-    def __init__(self, fileName, line, lineNo, match):
-        Directive.__init__(self, fileName, line, lineNo, match)
-
-    #---------------------------------------------------------------------------
-    def compile(self):
-        methodName  = self.match.group(1)
-        
-        self.methodName = methodName
-        
-        self.line = "scooj.defGetter(module, function %s() {" 
-        self.line = self.line % (methodName)
-            
-    #---------------------------------------------------------------------------
-    def endingSuffix(self):
-        return "}); "
-
-    #---------------------------------------------------------------------------
-    def getMethodName(self):      return self.methodName
     def isSuperReplaceable(self): return True
         
 #-------------------------------------------------------------------------------
-class DirectiveSetter(Directive):
+class DirectiveSetter(DirectiveMember):
 
+    __slots__    = ()
+    keyword      = "setter"
     matchPattern = re.compile("^setter\s+([\w$_]+)\s*(\(.*\))\s*$")
     
-    #---------------------------------------------------------------------------
-    def __init__(self, fileName, line, lineNo, match):
-        Directive.__init__(self, fileName, line, lineNo, match)
-
-    #---------------------------------------------------------------------------
-    def compile(self):
-        methodName  = self.match.group(1)
-        methodParms = self.match.group(2)
-        
-        self.methodName = methodName
-        
-        self.line = "scooj.defSetter(module, function %s%s {" 
-        self.line = self.line % (methodName, methodParms)
-            
-    #---------------------------------------------------------------------------
-    def endingSuffix(self):
-        return "}); "
+    defFunction  = "defSetter"
+    table        = "setters"
+    isSetter     = True
 
     #---------------------------------------------------------------------------
-    def getMethodName(self):      return self.methodName
     def isSuperReplaceable(self): return True
         
 #-------------------------------------------------------------------------------
 class DirectiveFunction(Directive):
 
+    __slots__    = ()
+    keyword      = "function"
     matchPattern = re.compile("^function\s+([\w$_]+)\s*(\(.*\))?\s*$")
 
     #---------------------------------------------------------------------------
@@ -449,13 +2944,13 @@ class DirectiveFunction(Directive):
 
     #---------------------------------------------------------------------------
     def compile(self):
-        functionName  = self.match.group(1)
-        functionParms = self.match.group(2)
+        functionName  = self.groups[0]
+        functionParms = self.groups[1]
 
         if not functionParms: functionParms = "()"
         
-        self.line = "function %s%s {" 
-        self.line = self.line % (functionName, functionParms)
+        line = "function %s%s {" 
+        return line % (functionName, functionParms)
             
     #---------------------------------------------------------------------------
     def endingSuffix(self):
@@ -464,6 +2959,8 @@ class DirectiveFunction(Directive):
 #-------------------------------------------------------------------------------
 class DirectiveStatic(Directive):
 
+    __slots__    = ()
+    keyword      = "static"
     matchPattern = re.compile("^static\s*$")
     
     #---------------------------------------------------------------------------
@@ -473,11 +2970,16 @@ class DirectiveStatic(Directive):
 
     #---------------------------------------------------------------------------
     def compile(self):
-        self.line = "// static code run on first require()"
+        return "// static code run on first require()"
+
+    #---------------------------------------------------------------------------
+    def hasCode(self): return False
 
 #-------------------------------------------------------------------------------
 class DirectiveInit(Directive):
 
+    __slots__    = ()
+    keyword      = "init"
     matchPattern = re.compile("^init\s*$")
 
     #---------------------------------------------------------------------------
@@ -486,11 +2988,16 @@ class DirectiveInit(Directive):
 
     #---------------------------------------------------------------------------
     def compile(self):
-        self.line = "// code run on first require()"
+        return "// code run on first require()"
+
+    #---------------------------------------------------------------------------
+    def hasCode(self): return False
 
 #-------------------------------------------------------------------------------
 class DirectiveRequire(Directive):
 
+    __slots__    = ()
+    keyword      = "require"
     matchPattern = re.compile("^require\s+([\w$\.\-/]+)(\s+as\s+([\w$.-]+))?\s*$")
     
     #---------------------------------------------------------------------------
@@ -499,16 +3006,22 @@ class DirectiveRequire(Directive):
 
     #---------------------------------------------------------------------------
     def compile(self):
-        moduleName = self.match.group(1)
-        varName    = self.match.group(3)
+        moduleName = self.groups[0]
+        varName    = self.groups[2]
         
         if not varName: varName = os.path.basename(moduleName)
         
-        self.line = "var %s = require('%s');" % (varName, moduleName)
+        return "var %s = require('%s');" % (varName, moduleName)
+
+    #---------------------------------------------------------------------------
+    def addInfo(self, info):
+        info.addRequire(self.groups[0])
 
 #-------------------------------------------------------------------------------
 class DirectiveRequireClass(Directive):
 
+    __slots__    = ()
+    keyword      = "requireClass"
     matchPattern = re.compile("^requireClass\s+([\w$\.\-/]+)(\s+as\s+([\w$.-]+))?\s*$")
 
     #---------------------------------------------------------------------------
@@ -517,15 +3030,19 @@ class DirectiveRequireClass(Directive):
 
     #---------------------------------------------------------------------------
     def compile(self):
-        moduleName = self.match.group(1)
-        varName    = self.match.group(3)
+        moduleName = self.groups[0]
+        varName    = self.groups[2]
 
         if not varName: varName = os.path.basename(moduleName)
 
-        self.line = "var %s = require('%s').getClass(); if (typeof %s != 'function') throw Error('module %s did not export a class');" % (varName, moduleName, varName, moduleName)
+        return "var %s = require('%s').getClass(); if (typeof %s != 'function') throw Error('module %s did not export a class');" % (varName, moduleName, varName, moduleName)
+
+    #---------------------------------------------------------------------------
+    def addInfo(self, info):
+        info.addRequire(self.groups[0])
 
 #-------------------------------------------------------------------------------
-Directive.classes.extend([
+Directive.register([
     DirectiveClass,
     DirectiveMixin,
     DirectiveStaticMethod,
@@ -542,7 +3059,7 @@ Directive.classes.extend([
 ])
 
 #-------------------------------------------------------------------------------
-def parseArgs():
+def parseArgs(argv=None):
     usage        = "usage: %s [options] FILE FILE ..." % PROGRAM
     version      = "%s %s" % (PROGRAM,VERSION)
     description  = getHelp()
@@ -553,6 +3070,106 @@ def parseArgs():
         help="generate .js files in DIR (default: %default)"
     )
     
+    parser.add_option("-f", "--force", dest="force", action="store_true", default=False,
+        help="recompile all files, ignoring the build manifest"
+    )
+    
+    parser.add_option("-w", "--watch", dest="watch", action="store_true", default=False,
+        help="after compiling, keep running and recompile files as they change"
+    )
+    
+    parser.add_option("-b", "--bundle", dest="bundleFileName", metavar="FILE", default=None,
+        help="generate a single bundle of all the modules in FILE, rather than .js files"
+    )
+    
+    parser.add_option("-e", "--entry", dest="entries", metavar="MODULE", action="append", default=[],
+        help="only bundle the modules MODULE requires, directly or indirectly (may be repeated)"
+    )
+    
+    parser.add_option("--deps", dest="depsFileName", metavar="FILE", default=None,
+        help="write the module dependency graph as JSON to FILE (- for stdout)"
+    )
+    
+    parser.add_option("--include", dest="includes", metavar="GLOB", action="append", default=[],
+        help="only compile the .scoop files matching GLOB (may be repeated)"
+    )
+    
+    parser.add_option("--exclude", dest="excludes", metavar="GLOB", action="append", default=[],
+        help="skip the files and directories matching GLOB (may be repeated)"
+    )
+    
+    parser.add_option("--cache-listings", dest="cacheListings", action="store_true", default=False,
+        help="reuse the listings of directories unchanged since the last build"
+    )
+    
+    parser.add_option("--cache-dir", dest="cacheDir", metavar="DIR", default=None,
+        help="share compiled modules with other builds through a cache in DIR"
+    )
+    
+    parser.add_option("--cache-size", dest="cacheSize", metavar="MB", type="int", default=256,
+        help="remove the least recently used modules from the cache above MB megabytes (default: %default)"
+    )
+    
+    parser.add_option("-z", "--gzip", dest="gzip", action="store_true", default=False,
+        help="also write a compressed .js.gz file for each .js file"
+    )
+    
+    parser.add_option("--gzip-level", dest="gzipLevel", metavar="N", type="int", default=9,
+        help="compress .js.gz files at level N, from 1 to 9 (default: %default)"
+    )
+    
+    parser.add_option("--all-errors", dest="allErrors", action="store_true", default=False,
+        help="report all the errors in each file, rather than just the first"
+    )
+    
+    parser.add_option("--errors-json", dest="errorsFileName", metavar="FILE", default=None,
+        help="write the errors as JSON to FILE (- for stdout)"
+    )
+    
+    parser.add_option("-j", "--jobs", dest="jobs", metavar="N", type="int", default=defaultJobs(),
+        help="compile with N worker processes (default: %default)"
+    )
+    
+    parser.add_option("--server", dest="server", action="store_true", default=False,
+        help="answer compile requests read from stdin, one JSON object per line"
+    )
+    
+    parser.add_option("--socket", dest="socketName", metavar="FILE", default=None,
+        help="answer compile requests like --server, on the Unix socket FILE"
+    )
+    
+    parser.add_option("-t", "--target", dest="targets", metavar="KIND:DIR", action="append", default=[],
+        help="generate .js files of KIND in DIR, rather than in the --out directory (may be repeated)"
+    )
+    
+    parser.add_option("--emit", dest="emit", metavar="MODE", type="choice", choices=EmitModes, default="default",
+        help="how classes are defined: default, static or lazy (default: %default)"
+    )
+    
+    parser.add_option("--compact", dest="compact", action="store_true", default=False,
+        help="leave out comments, blank lines and indentation, and write a line map for each .js file"
+    )
+    
+    parser.add_option("--static-super", dest="staticSuper", action="store_true", default=False,
+        help="call superclass functions directly rather than through $super"
+    )
+    
+    parser.add_option("--stats", dest="stats", action="store_true", default=False,
+        help="print timings of each compile phase, directive counts and the slowest files"
+    )
+    
+    parser.add_option("--stats-json", dest="statsFileName", metavar="FILE", default=None,
+        help="write the --stats statistics as JSON to FILE"
+    )
+    
+    parser.add_option("--stats-top", dest="statsTop", metavar="N", type="int", default=10,
+        help="list the N slowest files in the statistics (default: %default)"
+    )
+    
+    parser.add_option("--stream-size", dest="streamSize", metavar="BYTES", type="int", default=1048576,
+        help="stream files of BYTES or more instead of reading them whole (default: %default)"
+    )
+    
     parser.add_option("-q", "--quiet", dest="quiet", action="store_true", default=False,
         help="be quiet"
     )
@@ -561,43 +3178,73 @@ def parseArgs():
         help="be noisy"
     )
     
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     
     help = False
-    if len(args) == 0:   help = True
+    if len(args) == 0:   help = not (options.server or options.socketName)
     elif args[0] == "?": help = True
     
     if help:
         parser.print_help()
         sys.exit(0)
+        
+    if options.bundleFileName and options.watch:
+        parser.error("--bundle can not be used with --watch")
+        
+    if options.entries and not options.bundleFileName:
+        parser.error("--entry can only be used with --bundle")
+        
+    if options.gzipLevel < 1 or options.gzipLevel > 9:
+        parser.error("--gzip-level must be from 1 to 9")
+        
+    try:
+        options.targets = [Target.fromArg(arg) for arg in options.targets]
+    except ValueError, e:
+        parser.error(str(e))
     
     return (options, args)
     
+#-------------------------------------------------------------------------------
+def defaultJobs():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
 #-------------------------------------------------------------------------------
 def verbose(message):
-    if not Options.verbose: return
+    if not Options or not Options.verbose: return
     
-    print "%s: %s" % (PROGRAM, message)
+    emit("%s: %s" % (PROGRAM, message))
 
 #-------------------------------------------------------------------------------
 def log(message):
-    if Options.quiet: return
+    if Options and Options.quiet: return
     
-    print "%s: %s" % (PROGRAM, message)
+    emit("%s: %s" % (PROGRAM, message))
+
+#-------------------------------------------------------------------------------
+def emit(message):
+    if None != MessageBuffer:
+        MessageBuffer.append(message)
+        return
+        
+    print message
 
 #-------------------------------------------------------------------------------
 def logFile(fileName, lineNo, message):
-    log("%s:%d: %s" % (fileName, lineNo, message))
+    log("%s:%d: %s" % (fileName, lineNo + 1, message))
+
+#-------------------------------------------------------------------------------
+def logError(message):
+    # printed even with --quiet, like error()
+    emit("%s: %s" % (PROGRAM, message))
 
 #-------------------------------------------------------------------------------
 def error(message):
     print "%s: %s" % (PROGRAM, message)
     exit(1)
 
-#-------------------------------------------------------------------------------
-def errorFile(fileName, lineNo, message):
-    error("%s:%d: %s" % (fileName, lineNo, message))
-
 #-------------------------------------------------------------------------------
 def getHelp():
     return """
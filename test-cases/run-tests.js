@@ -34,4 +34,5 @@ var animals = require("./scoop/Animals").getClass()
 
 require("./scoop/Etc").getClass().runTests()
 require("./scoop/Mixins")
+require("./scoop/Supers")
 